@@ -0,0 +1,241 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewBench.py
+#
+# Purpose:     This module is used to benchmark the distributionViewer hot
+#              paths: CSV parsing (the original csv loop vs the numpy bulk
+#              parser), CSV ingestion (loadCSVData), display sampling
+#              (setPanelData), data match (dataCut + learnClass), percentile
+#              (getDataPercentile) and chart point building
+#              (PanelChart._buildSplinePtList). It generates synthetic
+#              NetFetcher CSV files, times each stage and reports the
+#              throughput and the peak memory, the result can be recorded to
+#              a JSON lines file to track the regressions run over run.
+#
+#              Usage example:
+#              python distributionViewBench.py --rows 1e4 1e5 1e6 --files 3
+#                     --record bench_history.jsonl
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import csv
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+import numpy as np
+
+with contextlib.redirect_stdout(sys.stderr):
+    import distributionViewData as dvd
+    import distributionViewMatch as dvm
+    import distributionViewCore as dvc
+
+DIST_TYPES = ('lognormal', 'normal', 'exponential', 'bimodal')
+GEN_CHUNK = 1000000     # rows generated and written in one chunk.
+STAGES = ('generate', 'parse_baseline', 'parse', 'ingest', 'ingest_cached', 'sample', 'match', 'percentile', 'render')
+
+#-----------------------------------------------------------------------------
+def genDelays(rng, dist, rowNum, scale):
+    """ Generate <rowNum> positive int delays (microseconds) around <scale>."""
+    if dist == 'lognormal':
+        data = rng.lognormal(np.log(scale), 0.5, rowNum)
+    elif dist == 'normal':
+        data = rng.normal(scale, scale/5, rowNum)
+    elif dist == 'exponential':
+        data = rng.exponential(scale, rowNum)
+    else: # bimodal: the second peak is a delayed (such as MITM) path.
+        data = np.where(rng.random(rowNum) < 0.8, rng.normal(scale, scale/6, rowNum),
+                        rng.normal(scale*2.5, scale/4, rowNum))
+    return np.maximum(data, 0).astype(np.int64)
+
+#-----------------------------------------------------------------------------
+def genCSVFile(fileName, rowNum, dist='lognormal', shift=1.0, seed=0):
+    """ Generate a synthetic NetFetcher CSV file with <rowNum> rows. Row format:
+        [timestamp, type0, type1, type2, type3, type4] (microseconds), the delay
+        scales are multiplied by <shift> to make a different data set.
+    """
+    rng = np.random.default_rng(seed)
+    scales = np.array((150, 3000, 3000, 2000, 120000))*shift
+    startT = 1559985507532879
+    with open(fileName, 'w') as f:
+        f.write('exp:%d,127.0.0.1,1073741824,1024\n' % (startT*1000))
+        for start in range(0, rowNum, GEN_CHUNK):
+            num = min(GEN_CHUNK, rowNum - start)
+            rows = np.empty((num, dvd.ROW_LEN), dtype=np.int64)
+            rows[:, 0] = startT + (start + np.arange(num))*320
+            for idx, scale in enumerate(scales):
+                rows[:, idx+1] = genDelays(rng, dist, num, scale)
+            np.savetxt(f, rows, fmt='%d', delimiter=',')
+
+#-----------------------------------------------------------------------------
+def prepareData(workDir, rowNum, fileNum, dist):
+    """ Generate (if not exist) <fileNum> model files and one data file of
+        <rowNum> rows, return the (model path pattern, data path pattern).
+    """
+    baseDir = os.path.join(workDir, '%s_%d' % (dist, rowNum))
+    for folder, num in (('model', fileNum), ('data', 1)):
+        os.makedirs(os.path.join(baseDir, folder), exist_ok=True)
+        for idx in range(num):
+            fileName = os.path.join(baseDir, folder, 'exp-%s%d.csv' % (folder, idx))
+            if os.path.isfile(fileName): continue
+            shift = 1.0 + 0.1*idx if folder == 'model' else 1.15
+            genCSVFile(fileName, rowNum, dist=dist, shift=shift, seed=idx+100*(folder == 'data'))
+    return os.path.join(baseDir, 'model', '*.csv'), os.path.join(baseDir, 'data', '*.csv')
+
+#-----------------------------------------------------------------------------
+def parseBaseline(fileName, typeIdx=0):
+    """ The original loadCSVData() csv loop: parse the file row by row and 
+        return the delay list of one type.
+    """
+    dataSet = []
+    with open(fileName) as f:
+        f_csv = csv.reader(f)
+        _ = next(f_csv)  # skip the csv header.
+        for row in f_csv:
+            i = int(row[typeIdx+1]) if typeIdx < 5 else (int(row[3])+int(row[4]))
+            dataSet.append(i)
+    return dataSet
+
+#-----------------------------------------------------------------------------
+def clearCache(pathPattern):
+    """ Remove the sidecar cache files of the CSV files."""
+    folder = os.path.dirname(pathPattern)
+    for name in os.listdir(folder):
+        if name.endswith(dvd.CACHE_EXT) or name.endswith(dvd.CACHE_EXT + dvd.META_EXT):
+            os.remove(os.path.join(folder, name))
+
+#-----------------------------------------------------------------------------
+def timeStage(func, repeat=1):
+    """ Run the function <repeat> times, return (best seconds, peak memory MB).
+        The timed runs are not traced (tracemalloc slows the allocations down),
+        the peak memory is taken from one more traced run.
+    """
+    best = None
+    for _ in range(repeat):
+        startT = time.perf_counter()
+        func()
+        usedT = time.perf_counter() - startT
+        best = usedT if best is None else min(best, usedT)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak/(1 << 20)
+
+#-----------------------------------------------------------------------------
+def getRenderFunc(dataCore):
+    """ Return the chart point building function of all the display modes, None
+        if wx is not installed.
+    """
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            import distributionViewPanel as dvp
+    except ImportError:
+        return None
+    # Build the chart panel object without creating the wx window.
+    chart = dvp.PanelChart.__new__(dvp.PanelChart)
+    chart.recNum, chart.appSize, chart.percentileScale = dvc.SAMPLE_COUNT, (1600, 700), 1
+    chart.logScale = (10, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000)
+    _, dataList = dataCore.buildPanelData('M')
+    chart.maxCount = max(max(data) for data in dataList) or 1
+    chart.binNum = max(len(data) for data in dataList)
+    def render():
+        for mode in range(3):
+            chart.displayMode = mode
+            for idx, data in enumerate(dataList): chart._buildSplinePtList(data, idx)
+    return render
+
+#-----------------------------------------------------------------------------
+def benchRows(workDir, rowNum, fileNum, dist, repeat, stages):
+    """ Run the benchmark stages on the data of <rowNum> rows per file, return
+        the result list of (stage, rows, seconds, rows/sec, peak MB).
+    """
+    results = []
+    def record(stage, func, rows, num=repeat):
+        if stage not in stages: return
+        usedT, peak = timeStage(func, num)
+        results.append({'stage': stage, 'rows': rows, 'seconds': usedT,
+                        'rowsPerSec': rows/usedT if usedT else 0, 'peakMB': peak})
+        print("%-14s rows=%-11d %10.4f s %14.0f rows/s %10.1f MB" % (
+            stage, rows, usedT, results[-1]['rowsPerSec'], peak))
+    totalRows = rowNum*(fileNum+1)
+    startT = time.perf_counter()
+    modelPath, dataPath = prepareData(workDir, rowNum, fileNum, dist)
+    if 'generate' in stages:
+        usedT = time.perf_counter() - startT
+        print("%-14s rows=%-11d %10.4f s (0 if the files already exist)" % ('generate', totalRows, usedT))
+    # the baseline loop parses one delay type, the bulk parser all the types.
+    dataFile = sorted(glob.glob(dataPath))[0]
+    record('parse_baseline', lambda: parseBaseline(dataFile), rowNum, 1)
+    record('parse', lambda: dvd.parseCSVFile(dataFile), rowNum)
+    parsed = dict((result['stage'], result['seconds']) for result in results)
+    if parsed.get('parse'):
+        print("%-14s %.1fx faster than the baseline" % ('parse', parsed['parse_baseline']/parsed['parse']))
+    dataCore = dvc.distributionDataCore(modelPath=modelPath, dataPath=dataPath, useCache=False)
+    def ingest():
+        dataCore.modelFiles = dataCore.dataFiles = []
+        dataCore.loadCSVData('M')
+        dataCore.loadCSVData('D')
+    record('ingest', ingest, totalRows, 1)
+    clearCache(modelPath)
+    clearCache(dataPath)
+    dataCore.useCache = True
+    ingest()    # build the sidecar cache.
+    record('ingest_cached', ingest, totalRows)
+    record('sample', lambda: dataCore.buildPanelData('M'), rowNum*fileNum)
+    samplePairs = dataCore.sampleMatchData()
+    matchRows = sum(len(model) + len(data) for model, data in samplePairs)
+    record('match', lambda: [dvm.matchSamples(*pair) for pair in samplePairs], matchRows)
+    record('percentile', lambda: dataCore.getDataPercentile(1), rowNum)
+    render = getRenderFunc(dataCore) if 'render' in stages else None
+    if render is None:
+        if 'render' in stages: print("render         skipped: wx is not installed.")
+    else:
+        record('render', render, dvc.SAMPLE_COUNT*fileNum*3)
+    return results
+
+#-----------------------------------------------------------------------------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark the distributionViewer hot paths.')
+    ap.add_argument('--rows', type=float, nargs='+', default=[1e4, 1e5, 1e6],
+                    help='Rows per CSV file of each benchmark round (1e4 - 1e8).')
+    ap.add_argument('--files', type=int, default=3, help='Model CSV files number.')
+    ap.add_argument('--dist', choices=DIST_TYPES, default='lognormal',
+                    help='Latency distribution of the synthetic data.')
+    ap.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'distributionViewBench'),
+                    help='Folder of the generated CSV files (reused between runs).')
+    ap.add_argument('--repeat', type=int, default=3, help='Repeat times, the best is reported.')
+    ap.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                    help='Benchmark stages to run.')
+    ap.add_argument('--record', default=None, help='JSON lines file to append the results.')
+    args = ap.parse_args(argv)
+    results = []
+    for rowNum in args.rows:
+        print("---- %s distribution, %d model files + 1 data file, %d rows per file ----" % (
+            args.dist, args.files, int(rowNum)))
+        results += benchRows(args.dir, int(rowNum), args.files, args.dist, args.repeat, args.stages)
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps({'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                'host': platform.node(), 'python': platform.python_version(),
+                                'numpy': np.__version__, 'dist': args.dist, 'files': args.files,
+                                'results': results}) + '\n')
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewCLI.py
+#
+# Purpose:     This module is used to run the distributionViewer data processing
+#              headless (no wx/display needed): load the model and data folder
+#              CSV files, build the per type histograms and the model/data
+#              match table, then save the result as a JSON or CSV file.
+#
+#              Usage example:
+#              python distributionViewCLI.py --model ./model --data ./data
+#                     --type 5 --format json --output result.json
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import csv
+import json
+import argparse
+import contextlib
+
+# The global module prints the source location when it is imported, keep the
+# stdout clean for the result output.
+with contextlib.redirect_stdout(sys.stderr):
+    import distributionViewGlobal as gv
+    import distributionViewData as dvd
+    import distributionViewMatch as dvm
+    import distributionViewCore as dvc
+
+MATCH_FIELDS = ('model', 'data', 'minThreshold', 'maxThreshold', 'truePositive',
+                'trueNegative', 'falsePositive', 'falseNegative', 'sensitivity',
+                'specifity')
+
+#-----------------------------------------------------------------------------
+def parseArgs(argv=None):
+    """ Parse the command line arguments."""
+    ap = argparse.ArgumentParser(
+        description='Build the latency distribution histograms and the model/data match table without the UI.')
+    ap.add_argument('--model', default=os.path.dirname(gv.MODE_F_PATH),
+                    help='Model CSV files folder.')
+    ap.add_argument('--data', default=os.path.dirname(gv.DATA_F_PATH),
+                    help='Data CSV files folder.')
+    ap.add_argument('--type', type=int, default=gv.iModelType, choices=range(dvd.TYPE_NUM),
+                    help='Delay type used to match the data (0-5).')
+    ap.add_argument('--bin-width', type=int, default=dvd.BIN_WIDTH,
+                    help='Histogram bin width (microseconds), picked from the histogram pyramid if it is a multiple of %s.' 
+                    % '/'.join(str(w) for w in dvd.PYRAMID_WIDTHS))
+    ap.add_argument('--bin-num', type=int, default=dvc.SAMPLE_COUNT,
+                    help='Histogram bin number, the delays out of the range are counted in an extra last bin.')
+    ap.add_argument('--sample-rate', type=int, default=30,
+                    help='Percentage of the samples used to match the data.')
+    ap.add_argument('--workers', type=int, default=1,
+                    help='File loading and match worker processes number, 1 - no process pool, 0 - all CPU cores.')
+    ap.add_argument('--format', choices=('json', 'csv'), default='json',
+                    help='Output format: json - histograms and match table, csv - match table.')
+    ap.add_argument('--output', default='-', help='Output file path, "-" for stdout.')
+    ap.add_argument('--no-cache', action='store_true',
+                    help='Do not use/write the sidecar cache of the parsed CSV files.')
+    ap.add_argument('--out-of-core-size', type=int, default=gv.iOutOfCoreSize >> 20,
+                    help='CSV file bigger than this size (MB) is streamed in chunks with bounded memory, 0 - disable.')
+    ap.add_argument('--window', type=int, default=0,
+                    help='Only count the rows of the last N seconds of each file (by the row timestamps), 0 - all the rows.')
+    ap.add_argument('--progress', action='store_true',
+                    help='Print the CSV file loading progress to stderr.')
+    return ap.parse_args(argv)
+
+#-----------------------------------------------------------------------------
+def buildResult(dataCore, pool=None):
+    """ Build the result dict: each file's per type histograms, the data
+        percentile and the model/data match table.
+    """
+    binWidth, binNum = dataCore.binView['M']
+    result = {'binWidth': binWidth, 'binNum': binNum,
+              'modelType': dataCore.ModeChIdx, 'dataType': dataCore.DataChIdx,
+              'sampleRate': dataCore.sampleRate, 'windowSec': dataCore.windowTime//1000000}
+    for key, tag, fileList in (('model', 'M', dataCore.modelFiles), ('data', 'D', dataCore.dataFiles)):
+        result[key] = [{'file': dataFile.fileName, 'rows': dataFile.rowNum,
+                        'histograms': dataCore.fileHistograms(tag, dataFile).tolist()}
+                       for dataFile in fileList]
+    dataCore.getDataPercentile(1)
+    result['percentile99.9'] = int(dataCore.percentile)
+    matchTable = []
+    if dataCore.modelFiles and dataCore.dataFiles:
+        dataName = dataCore.dataFiles[0].fileName
+        for dataFile, row in zip(dataCore.modelFiles, dataCore.buildMatchTable(pool=pool)):
+            matchTable.append(dict(zip(MATCH_FIELDS, (dataFile.fileName, dataName) + tuple(row))))
+    result['match'] = matchTable
+    return result
+
+#-----------------------------------------------------------------------------
+def printProgress(fileName, parsedBytes, fileBytes):
+    """ Print the file loading progress to stderr."""
+    pct = 100 if fileBytes <= 0 else parsedBytes*100//fileBytes
+    print("\rLoading %s : %3d%%" % (fileName, pct), end='\n' if pct >= 100 else '', file=sys.stderr)
+
+#-----------------------------------------------------------------------------
+def writeResult(result, fmt, fh):
+    """ Write the result to the file handle in the format."""
+    if fmt == 'json':
+        json.dump(result, fh, indent=1)
+        fh.write('\n')
+    else:
+        writer = csv.DictWriter(fh, fieldnames=MATCH_FIELDS)
+        writer.writeheader()
+        writer.writerows(result['match'])
+
+#-----------------------------------------------------------------------------
+def main(argv=None):
+    args = parseArgs(argv)
+    gv.iOutOfCoreSize = args.out_of_core_size << 20
+    dataCore = dvc.distributionDataCore(modelPath=os.path.join(args.model, '*.csv'),
+                                        dataPath=os.path.join(args.data, '*.csv'),
+                                        useCache=not args.no_cache)
+    dataCore.ModeChIdx = dataCore.DataChIdx = args.type
+    dataCore.sampleRate = args.sample_rate
+    dataCore.setBinView(args.bin_width, binNum=args.bin_num)
+    dataCore.windowNum = max(0, args.window)  # one bucket per second.
+    dataCore.setWindow(args.window)
+    progress = printProgress if args.progress else None
+    pool = None if args.workers == 1 else dvm.createPool(args.workers)
+    try:
+        dataCore.loadCSVData('M', progress=progress, pool=pool)
+        dataCore.loadCSVData('D', progress=progress, pool=pool)
+        result = buildResult(dataCore, pool=pool)
+    finally:
+        if pool is not None: pool.shutdown()
+    if args.output == '-':
+        writeResult(result, args.format, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as fh:
+            writeResult(result, args.format, fh)
+        print("Result saved in: %s" % args.output, file=sys.stderr)
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewCore.py
+#
+# Purpose:     This module is used to provide the wx independent data manager 
+#              core of the distributionViewer: load the model/data folder CSV
+#              files, build the per type histograms and display samples, the 
+#              data percentile and the model/data match table. It is used by 
+#              the UI data manager and the headless command line mode.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import os
+import glob
+import numpy as np
+# Import the local modules
+import distributionViewGlobal as gv
+import distributionViewData as dvd
+import distributionViewMatch as dvm
+
+SAMPLE_COUNT = 760  # max number of sample displayed in Y-Axis.
+MATCH_NUM = 3       # max number of model data sets matched to the data.
+POLL_FILE_NUM = 20  # files polled in one gv.iPollRate period by the folder watcher.
+
+#-----------------------------------------------------------------------------
+def fileSortKey(fileName):
+    """ Sort key of the data set files: the listener's live data (named by its
+        URL, such as live://127.0.0.1:5600) is put first, so it is shown in 
+        the first panel slot, then the files in the path order.
+    """
+    return ('://' not in fileName, fileName)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class distributionDataCore(object):
+    """ wx independent manager core to process the csv files in the [model] and
+        [data] folders.
+    """
+    def __init__(self, modelPath=None, dataPath=None, useCache=None):
+        self.modelPath = gv.MODE_F_PATH if modelPath is None else modelPath
+        self.dataPath = gv.DATA_F_PATH if dataPath is None else dataPath
+        self.useCache = gv.iCacheFlag if useCache is None else useCache
+        self.windowNum = gv.iWindowNum  # time window buckets kept by each file, 0 - disable.
+        self.windowTime = 0     # time window (microseconds) of the view, 0 - whole file.
+        self.sampleRate = 30    # % of samples we will load from the [model] file.
+        self.percentile = 1     # percentile of data we are going to show.     
+        self.ModeChIdx = gv.iModelType
+        self.DataChIdx = gv.iDataType
+        self.modelFiles = []    # mode folder files' parsed data (dvd.csvDataFile).
+        self.dataFiles = []     # data folder files' parsed data (dvd.csvDataFile).
+        self.modelD = []    # mode folder data set (current type column view).
+        self.dataD = []     # data folder data set (current type column view).
+        self.rng = np.random.default_rng()  # random generator to sample data.
+        # (bin width(microseconds), bin number) of the [model]/[data] view.
+        self.binView = {'M': (dvd.BIN_WIDTH, SAMPLE_COUNT), 'D': (dvd.BIN_WIDTH, SAMPLE_COUNT)}
+        # {file name: (size, mtime, inode)} of the [model]/[data] files at the last load.
+        self.fileStats = {'M': {}, 'D': {}}
+        # {file name: dvd.csvDataFile} of the [model]/[data] files being streamed.
+        self.liveFiles = {'M': {}, 'D': {}}
+
+#--distributionDataCore--------------------------------------------------------
+    def setBinView(self, binWidth, binNum=SAMPLE_COUNT, tag=None):
+        """ Set the histogram bin width(microseconds) and bin number of the 
+            [model]/[data] view, both views are set if the tag is None.
+        """
+        if binWidth <= 0 or binNum <= 0:
+            print("The bin width and bin number must be positive!")
+            return
+        for key in (('M', 'D') if tag is None else (tag,)):
+            self.binView[key] = (int(binWidth), int(binNum))
+
+#--distributionDataCore--------------------------------------------------------
+    def setWindow(self, windowSec):
+        """ Set the view to the rows of the last <windowSec> seconds (of each 
+            file's newest row timestamp), 0 - all the rows. The window is 
+            limited to the windowNum buckets kept by the files.
+        """
+        self.windowTime = int(max(0, windowSec)*1000000)
+
+#--distributionDataCore--------------------------------------------------------
+    def getDataPercentile(self, setTag):
+        """ Calculate the data pervertile value base on the input tag:
+            0 - 100%, 1 - 99.9%. The value is read from the merged quantile 
+            sketches of the data files, the data is not scanned.
+        """
+        if setTag == 0:
+            self.percentile = 1
+            return
+        sketch = dvd.quantileSketch.mergeAll(
+            [dataFile.sketches[self.DataChIdx] for dataFile in self.dataFiles])
+        val = sketch.quantile(0.999)
+        self.percentile = 1 if val is None else val//self.binView['D'][0]
+
+#--distributionDataCore--------------------------------------------------------
+    def loadCSVData(self, tag, progress=None, pool=None):
+        """ Check all the csv file from the load the data. tag = 'M' : model folder
+            tag ='D': data folder. The file already loaded will only parse the 
+            new appended rows, the file bigger than gv.iOutOfCoreSize is loaded
+            in the out-of-core mode. If the process pool is given, the new files
+            are loaded in parallel (one file per job), the files are always kept
+            in the fileSortKey() order. The live (streamed) files are kept and
+            not read. Return True if the data is changed.
+            progress - callback function progress(fileName, parsedBytes, fileBytes).
+        """
+        if not tag:
+            print("The input type tag must be defined!")
+            return
+        newRows = 0
+        stats = self._statFiles(tag)  # take it before parsing, so later changes are found.
+        liveFiles = self.liveFiles[tag]
+        filePaths = sorted(set(stats) | set(liveFiles), key=fileSortKey)
+        # Keep the files already loaded, so only the appended rows are parsed.
+        loadedFiles = dict((dataFile.fileName, dataFile) for dataFile in 
+                           (self.modelFiles if tag == 'M' else self.dataFiles))
+        loadedFiles.update(liveFiles)
+        newFiles = [fileName for fileName in filePaths if fileName not in loadedFiles]
+        futures = {}
+        if pool is not None and len(newFiles) > 1:
+            futures = dict((fileName, pool.submit(dvd.loadDataFile, fileName, self.useCache, SAMPLE_COUNT,
+                                                  self._isOutOfCore(fileName), self.windowNum))
+                           for fileName in newFiles)
+        dataFiles = []
+        for fileName in filePaths:
+            dataFile = loadedFiles.get(fileName)
+            fileProgress = (lambda done, total, name=fileName: progress(name, done, total)) if progress else None
+            if dataFile is None and fileName in futures:
+                dataFile = futures[fileName].result()
+                if fileProgress: fileProgress(dataFile.offset, dataFile.offset)
+                newRows = -1
+            elif dataFile is None:
+                dataFile = dvd.csvDataFile(fileName, useCache=self.useCache, binNum=SAMPLE_COUNT,
+                                           outOfCore=self._isOutOfCore(fileName), windowNum=self.windowNum)
+                dataFile.load(progress=fileProgress)
+                newRows = -1
+            elif fileName in liveFiles:
+                pass    # the rows are appended by appendLiveRows().
+            else:
+                rowNum = dataFile.update(progress=fileProgress)
+                newRows = -1 if rowNum < 0 or newRows < 0 else newRows + rowNum
+            dataFiles.append(dataFile)
+        if len(dataFiles) != len(loadedFiles): newRows = -1
+        if tag == 'M':
+            self.modelFiles = dataFiles
+        else:
+            self.dataFiles = dataFiles
+        self.fileStats[tag] = stats
+        self._selectType(tag)
+        return newRows != 0
+
+#--distributionDataCore--------------------------------------------------------
+    def appendLiveRows(self, tag, fileName, lines):
+        """ Append the streamed CSV lines of the file being written by the 
+            experiment to the [model]/[data] data set, the file is added as a
+            live file (replace the loaded file of the same name) on the first
+            lines. Return (file index, True if the file is added).
+        """
+        dataFile = self.liveFiles[tag].get(fileName)
+        if dataFile is None:
+            dataFile = dvd.csvDataFile(fileName, useCache=False, binNum=SAMPLE_COUNT, windowNum=self.windowNum)
+        dataFile.appendLines(lines)
+        return self.setLiveFile(tag, dataFile)
+
+#--distributionDataCore--------------------------------------------------------
+    def setLiveFile(self, tag, dataFile):
+        """ Set the live file (such as a listener's data snapshot) to the
+            [model]/[data] data set, it replaces the live/loaded file of the
+            same name. Return (file index, True if the file is added).
+        """
+        fileList = self.modelFiles if tag == 'M' else self.dataFiles
+        added = dataFile.fileName not in self.liveFiles[tag]
+        self.liveFiles[tag][dataFile.fileName] = dataFile
+        fileList = [oldFile for oldFile in fileList if oldFile.fileName != dataFile.fileName] + [dataFile]
+        fileList.sort(key=lambda oldFile: fileSortKey(oldFile.fileName))
+        if tag == 'M':
+            self.modelFiles = fileList
+        else:
+            self.dataFiles = fileList
+        self._selectType(tag)
+        return fileList.index(dataFile), added
+
+#--distributionDataCore--------------------------------------------------------
+    def closeLiveFile(self, tag, fileName):
+        """ Stop streaming the live file, it is taken as parsed if the written
+            file has all the streamed lines, otherwise it will be reloaded or 
+            removed by the next loadCSVData().
+        """
+        dataFile = self.liveFiles[tag].pop(fileName, None)
+        if dataFile is not None and not dataFile.syncFile():
+            dataFile.inode = None   # reload it if the file exists.
+
+#--distributionDataCore--------------------------------------------------------
+    def _statFiles(self, tag):
+        """ Return the {file name: (size, mtime, inode)} of the [model]/[data] 
+            folder csv files.
+        """
+        stats = {}
+        for fileName in glob.glob(self.modelPath if tag == 'M' else self.dataPath):
+            try:
+                stat = os.stat(fileName)
+            except OSError:
+                continue    # the file is removed after the glob.
+            stats[fileName] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return stats
+
+#--distributionDataCore--------------------------------------------------------
+    def scanFolder(self, tag):
+        """ Stat the [model]/[data] folder csv files (the files are not read), 
+            return the sorted (added, removed, changed) file name lists since 
+            the last load, a file is changed if its size, mtime or inode changed.
+        """
+        stats, lastStats = self._statFiles(tag), self.fileStats[tag]
+        added = sorted(set(stats) - set(lastStats))
+        removed = sorted(set(lastStats) - set(stats))
+        changed = sorted(fileName for fileName, stat in stats.items() 
+                         if fileName in lastStats and stat != lastStats[fileName])
+        return added, removed, changed
+
+#--distributionDataCore--------------------------------------------------------
+    def getPollInterval(self, tag):
+        """ Return the folder poll interval(sec) of the [model]/[data] folder, it
+            is increased by gv.iPollRate for every POLL_FILE_NUM files.
+        """
+        fileNum = len(self.fileStats[tag])
+        return gv.iPollRate * max(1, -(-fileNum // POLL_FILE_NUM))
+
+#--distributionDataCore--------------------------------------------------------
+    def _isOutOfCore(self, fileName):
+        """ Return True if the file should be loaded in the out-of-core mode."""
+        return 0 < gv.iOutOfCoreSize < os.path.getsize(fileName)
+
+#--distributionDataCore--------------------------------------------------------
+    def _selectType(self, tag):
+        """ Point the [model]/[data] data set to the current type's column of 
+            each loaded file, no file will be re-read.
+        """
+        if tag == 'M':
+            self.modelD = [dataFile.columns[self.ModeChIdx] for dataFile in self.modelFiles]
+        else:
+            self.dataD = [dataFile.columns[self.DataChIdx] for dataFile in self.dataFiles]
+
+#--distributionDataCore--------------------------------------------------------
+    def buildPanelData(self, tag, fileIdxs=None):
+        """ Build the display data snapshot based on the smaple rate, return the
+            (file path list, data list of each file). tag = 'M' : model csv, 
+            tag ='D': data csv. If the file index list <fileIdxs> is given, the 
+            data list only has the data of these files.
+        """
+        fileList, typeIdx = (self.modelFiles, self.ModeChIdx) if tag == 'M' else (self.dataFiles, self.DataChIdx)
+        binNum = self.binView[tag][1]
+        dataList = []
+        for dataFile in (fileList if fileIdxs is None else [fileList[idx] for idx in fileIdxs]):
+            # draw the samples from the histogram picked from the pyramid (or 
+            # the time window), the too big data is counted in the last bin and
+            # filtered.
+            hist = self.fileHistograms(tag, dataFile, typeIdx)
+            data = dvd.sampleHistogram(hist, int(hist.sum())*self.sampleRate//100, 
+                                       rng=self.rng)[:binNum].tolist()
+            data[1], data[0], data[-1] = data[0], 0, 0
+            dataList.append(data)
+        return tuple(dataFile.fileName for dataFile in fileList), tuple(dataList)
+
+#--distributionDataCore--------------------------------------------------------
+    def getHistograms(self, tag, typeIdx):
+        """ Return the exact bin counts list (the last bin counts the out of 
+            range delays) of each [model]/[data] file for the delay type.
+        """
+        fileList = self.modelFiles if tag == 'M' else self.dataFiles
+        return [self.fileHistograms(tag, dataFile, typeIdx) for dataFile in fileList]
+
+#--distributionDataCore--------------------------------------------------------
+    def fileHistograms(self, tag, dataFile, typeIdx=None):
+        """ Return the histograms (of the <typeIdx> type if given) of the file in
+            the [model]/[data] bin view, the histograms of the time window are 
+            merged from the file's window buckets if the window is set, all the
+            rows are used if the file has no window or the bin view can not be
+            merged from the window buckets.
+        """
+        binWidth, binNum = self.binView[tag]
+        if self.windowTime and dataFile.window is not None:
+            hists = dataFile.window.getHistograms(self.windowTime, binWidth, binNum, typeIdx=typeIdx)
+            if hists is not None: return hists
+        return dataFile.getHistograms(binWidth, binNum, typeIdx=typeIdx)
+
+#--distributionDataCore--------------------------------------------------------
+    def sampleMatchData(self):
+        """ Sample the Model lists and Data list[0] for the match, return the 
+            list of (model sample, data sample) arrays, one for each model set.
+        """
+        if not self.dataD: return []
+        recNum = len(self.dataD[0])*self.sampleRate//100
+        dataSet, samplePairs = self.dataD[0], []
+        for modelSet in self.modelD[:MATCH_NUM]:
+            samplePairs.append((modelSet[self.rng.choice(len(modelSet), recNum, replace=False)],
+                                dataSet[self.rng.choice(len(dataSet), recNum, replace=False)]))
+        return samplePairs
+
+#--distributionDataCore--------------------------------------------------------
+    def buildMatchTable(self, pool=None):
+        """ match the data from all the Model lists to Data list[0], return the 
+            match result row of each model set: (min threshold, max threshold, 
+            tp, tn, fp, fn, sensitivity, specifity). If the process pool is 
+            given, the model sets are matched in parallel.
+        """
+        samplePairs = self.sampleMatchData()
+        if pool is None: 
+            return [dvm.matchSamples(*pair) for pair in samplePairs]
+        shm, specs = dvm.shareArrays([sample for pair in samplePairs for sample in pair])
+        try:
+            futures = [pool.submit(dvm.matchJob, shm.name, specs[2*idx], specs[2*idx+1]) 
+                       for idx in range(len(samplePairs))]
+            return [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
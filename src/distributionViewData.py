@@ -0,0 +1,738 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewData.py
+#
+# Purpose:     This module is used to parse the NetFetcher experiment CSV files
+#              into columnar integer arrays (one column per delay type) and
+#              keep a binary sidecar cache of the parsed result, so the data
+#              manager can reuse it until the source CSV file is changed. The
+#              rows appended to a growing CSV file are parsed incrementally.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import os
+import copy
+import glob
+import json
+import time
+import warnings
+import numpy as np
+
+TYPE_NUM = 6            # delay type number: Type 0 - Type 5.
+CACHE_EXT = '.npy'      # sidecar cache file extension.
+META_EXT = '.json'      # sidecar cache meta file extension.
+ROW_DTYPE = np.int64    # data type of the parsed CSV rows (64-bit timestamp).
+ROW_MAX = int(np.iinfo(ROW_DTYPE).max)
+ROW_MIN = int(np.iinfo(ROW_DTYPE).min)
+DATA_DTYPE = np.int32   # data type of the delay columns, 4 bytes per sample, the
+                        # delays (microseconds) are saturated at the limit.
+DATA_MAX = int(np.iinfo(DATA_DTYPE).max)
+DATA_MIN = int(np.iinfo(DATA_DTYPE).min)
+COUNT_DTYPE = np.int64  # data type of the histogram bin counts.
+ROW_LEN = TYPE_NUM      # CSV row length: timestamp + Type 0 - Type 4.
+CHUNK_SIZE = 1 << 22    # bytes of CSV lines parsed together in one chunk.
+RESERVOIR_NUM = 1 << 20 # rows of the reservoir sample kept in the out-of-core mode.
+BIN_WIDTH = 1000        # histogram bin width (microseconds), 1 ms per bin.
+BIN_NUM = 760           # histogram bin number, the last extra bin counts the
+                        # out of range delays.
+PYRAMID_WIDTHS = (10, 100, 1000, 10000) # histogram pyramid levels' bin width (microseconds).
+PYRAMID_BIN_NUM = 7600  # bin number of each pyramid level, the last extra bin 
+                        # counts the out of range delays.
+SKETCH_DELTA = 500      # quantile sketch compression parameter (~delta/2 centroids).
+BUCKET_TIME = 1000000   # time window bucket length (microseconds), 1 s per bucket.
+WINDOW_WIDTH = 1000     # time window buckets' histogram bin width (microseconds).
+WINDOW_DTYPE = np.int32 # data type of the time window buckets' bin counts.
+
+#-----------------------------------------------------------------------------
+def _cachePaths(fileName):
+    """ Return the (cache, meta) sidecar file paths of the input CSV file. The
+        cache is saved as the version files <file>.<version>.npy named by the 
+        meta, the (unversioned) cache path is only read for the old caches.
+    """
+    cacheName = fileName + CACHE_EXT
+    return cacheName, cacheName + META_EXT
+
+#-----------------------------------------------------------------------------
+def _fileSignature(fileName):
+    """ Return the [size, mtime] signature used to validate the cache."""
+    stat = os.stat(fileName)
+    return [stat.st_size, stat.st_mtime_ns]
+
+#-----------------------------------------------------------------------------
+def _parseRowsSlow(lines):
+    """ Parse the CSV lines one by one with python, the rows which are not 
+        [timestamp + 5 int delay values] are skipped. Used as the fall back 
+        of the bulk parser for the chunk which has malformed rows.
+    """
+    rows = []
+    for line in lines:
+        row = line.split(b',')
+        if len(row) < ROW_LEN: continue
+        try:
+            # NetFetcher writes a negative delay as a wrapped unsigned 64-bit
+            # value, clamp it so it is still filtered as a "too big" delay.
+            rows.append([max(min(int(val), ROW_MAX), ROW_MIN) for val in row[:ROW_LEN]])
+        except ValueError:
+            continue
+    return np.array(rows, dtype=ROW_DTYPE).reshape(-1, ROW_LEN)
+
+#-----------------------------------------------------------------------------
+def isHeaderLine(line):
+    """ Return True if the CSV line (bytes) is a header line (such as the 'exp:'
+        line), the first field of a data row is the int timestamp.
+    """
+    return not line.split(b',', 1)[0].strip().lstrip(b'-').isdigit()
+
+#-----------------------------------------------------------------------------
+def parseBlock(data):
+    """ Bulk parse the block (bytes) of complete CSV lines to a (rowNum, ROW_LEN)
+        int array with numpy, the python row parser is used as the fall back if
+        any line is malformed (not ROW_LEN non-negative int values).
+    """
+    if b'\r' in data: data = data.replace(b'\r', b'')
+    if data and not data.endswith(b'\n'): data += b'\n'
+    rowNum = data.count(b'\n')
+    if rowNum == 0: return np.zeros((0, ROW_LEN), dtype=ROW_DTYPE)
+    if b'-' not in data:
+        try:
+            with warnings.catch_warnings():
+                # numpy only warns and returns the parsed part on unmatched data.
+                warnings.simplefilter('error', DeprecationWarning)
+                # every line end is parsed as a -1 marker value, a line with 
+                # the wrong field number moves the markers out of the last 
+                # column, so the lines are checked without a python loop.
+                values = np.fromstring(data.replace(b'\n', b',-1,'), dtype=ROW_DTYPE, sep=',')
+            if values.size == rowNum*(ROW_LEN+1):
+                values = values.reshape(rowNum, ROW_LEN+1)
+                if (values[:, ROW_LEN] == -1).all(): return values[:, :ROW_LEN]
+        except (DeprecationWarning, ValueError):
+            pass
+    return _parseRowsSlow(data.splitlines())
+
+#-----------------------------------------------------------------------------
+def parseRows(lines):
+    """ Bulk parse the CSV lines (bytes) to a (rowNum, ROW_LEN) int array, see
+        parseBlock().
+    """
+    return parseBlock(b''.join(lines))
+
+#-----------------------------------------------------------------------------
+def rowsToColumns(rows):
+    """ Convert the parsed (rowNum, ROW_LEN) CSV rows to the compact 
+        (TYPE_NUM, rowNum) delay type columns, the delays are saturated at the 
+        DATA_DTYPE limit, Type 5 = Type 2 + Type 3 (saturated at the limit).
+    """
+    columns = np.empty((TYPE_NUM, len(rows)), dtype=DATA_DTYPE)
+    delays = np.clip(rows[:, 1:ROW_LEN].T, DATA_MIN, DATA_MAX)
+    columns[:TYPE_NUM-1] = delays
+    # the saturated 32-bit delays can not overflow in the 64-bit sum.
+    columns[TYPE_NUM-1] = np.clip(delays[2] + delays[3], DATA_MIN, DATA_MAX)
+    return columns
+
+#-----------------------------------------------------------------------------
+def iterCSVRows(fileName, offset=0, chunkSize=CHUNK_SIZE):
+    """ Parse the NetFetcher CSV file from the byte <offset> chunk by chunk and
+        yield the (rows, endOffset) of each chunk, if the file is parsed from
+        the start (offset = 0), the header line (if the first line is not a 
+        data row) is yielded as an empty chunk.
+        A last line without the line end is treated as still being written 
+        and is not parsed.
+    """
+    with open(fileName, 'rb') as f:
+        f.seek(offset)
+        if offset == 0:
+            header = f.readline()  # skip the csv header.
+            if not header.endswith(b'\n'): return
+            if isHeaderLine(header):
+                offset = len(header)
+                yield np.zeros((0, ROW_LEN), dtype=ROW_DTYPE), offset
+            else:
+                f.seek(0)   # the file has no header.
+        # read the raw blocks (no line objects), the part after the last line
+        # end is carried to the next block.
+        carry = b''
+        while True:
+            data = f.read(chunkSize)
+            if not data: break
+            data = carry + data
+            cut = data.rfind(b'\n') + 1
+            carry = data[cut:]
+            if not cut: continue
+            offset += cut
+            yield parseBlock(data[:cut]), offset
+
+#-----------------------------------------------------------------------------
+def iterCSVChunks(fileName, offset=0, chunkSize=CHUNK_SIZE):
+    """ Same as iterCSVRows() but yield the (columns, endOffset) of each chunk."""
+    for rows, offset in iterCSVRows(fileName, offset=offset, chunkSize=chunkSize):
+        yield rowsToColumns(rows), offset
+
+#-----------------------------------------------------------------------------
+def parseCSVFile(fileName, offset=0, chunkSize=CHUNK_SIZE, progress=None):
+    """ Parse the NetFetcher CSV file from the byte <offset> (0 - file start, the
+        header line will be skipped) and return (columns, endOffset): 
+        columns - (TYPE_NUM, rowNum) int array, row idx n is the Type n delay 
+        column. CSV row format: [timestamp, type0, type1, type2, type3, type4], 
+        Type 5 = Type 2 + Type 3. 
+        endOffset - byte offset after the last parsed line, a last line without
+        the line end is treated as still being written and is not parsed.
+        progress - callback function progress(parsedBytes, fileBytes).
+    """
+    chunks, endOffset, fileSize = [], offset, os.path.getsize(fileName)
+    for columns, endOffset in iterCSVChunks(fileName, offset=offset, chunkSize=chunkSize):
+        chunks.append(columns)
+        if progress: progress(endOffset, fileSize)
+    if not chunks: return rowsToColumns(np.zeros((0, ROW_LEN), dtype=ROW_DTYPE)), 0
+    return np.concatenate(chunks, axis=1), endOffset
+
+#-----------------------------------------------------------------------------
+def buildHistograms(columns, binWidth=BIN_WIDTH, binNum=BIN_NUM):
+    """ Count the delay type columns into a (TYPE_NUM, binNum+1) histogram array,
+        bin n counts the delay in [n*binWidth, (n+1)*binWidth), the last bin 
+        counts the delay out of the range (too big or negative).
+    """
+    hists = np.zeros((len(columns), binNum+1), dtype=COUNT_DTYPE)
+    for typeIdx, column in enumerate(columns):
+        binIdx = column // binWidth
+        binIdx[(binIdx < 0) | (binIdx >= binNum)] = binNum
+        hists[typeIdx] = np.bincount(binIdx, minlength=binNum+1)
+    return hists
+
+#-----------------------------------------------------------------------------
+def pickPyramidLevel(binWidth, binNum, widths=PYRAMID_WIDTHS, levelBinNum=PYRAMID_BIN_NUM):
+    """ Return the (level, factor) of the coarsest histogram pyramid level whose
+        bin width divides <binWidth> (factor = binWidth/level bin width) and 
+        whose range covers binWidth*binNum. Return None if no level can be used.
+    """
+    for level in reversed(range(len(widths))):
+        factor = binWidth // widths[level]
+        if factor and binWidth % widths[level] == 0 and binNum*factor <= levelBinNum:
+            return level, factor
+    return None
+
+#-----------------------------------------------------------------------------
+def mergeBins(hists, factor, binNum):
+    """ Sum every <factor> bins of the (..., n+1) histograms into (..., binNum+1)
+        histograms, the last bin counts all the delays out of the new range.
+    """
+    result = np.empty(hists.shape[:-1] + (binNum+1,), dtype=COUNT_DTYPE)
+    result[..., :binNum] = hists[..., :binNum*factor].reshape(
+        hists.shape[:-1] + (binNum, factor)).sum(axis=-1)
+    result[..., binNum] = hists.sum(axis=-1) - result[..., :binNum].sum(axis=-1)
+    return result
+
+#-----------------------------------------------------------------------------
+def sampleHistogram(hist, sampleNum, rng=None):
+    """ Return the bin counts of <sampleNum> rows drawn without replacement 
+        from the rows counted in the histogram. It is a multivariate 
+        hypergeometric draw over the bins, so the cost is O(bins) not O(rows).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    sampleNum = min(sampleNum, int(hist.sum()))
+    return rng.multivariate_hypergeometric(hist, sampleNum, method='marginals')
+
+#-----------------------------------------------------------------------------
+def loadCachedColumns(fileName):
+    """ Return the (memory mapped columns, meta dict) cache of the CSV file if 
+        the cache is still valid (source file size and mtime not changed and 
+        the columns are saved in DATA_DTYPE), else return None.
+    """
+    cacheName, metaName = _cachePaths(fileName)
+    if not os.path.isfile(metaName): return None
+    try:
+        with open(metaName) as f:
+            meta = json.load(f)
+        if meta.get('signature') != _fileSignature(fileName): return None
+        if 'cache' in meta: cacheName = os.path.join(os.path.dirname(fileName), meta['cache'])
+        columns = np.load(cacheName, mmap_mode='r')
+        return (columns, meta) if columns.dtype == DATA_DTYPE else None
+    except (OSError, ValueError, KeyError) as err:
+        print("Load cache of %s error: %s" % (fileName, str(err)))
+        return None
+
+#-----------------------------------------------------------------------------
+def saveCachedColumns(fileName, columns, signature, offset, sketches=None):
+    """ Save the parsed columns to the sidecar cache file of the CSV file, the
+        parsed offset and the columns' quantile sketches are saved in the meta.
+    """
+    cacheName, metaName = _cachePaths(fileName)
+    # the columns are written to a new version file (the old version may be
+    # still memory mapped, it can not be replaced on Windows), then the meta
+    # is replaced to point to it, so a reader never gets a half written cache.
+    newName = '%s.%d%s' % (fileName, time.time_ns(), CACHE_EXT)
+    try:
+        with open(newName + '.tmp', 'wb') as f:
+            np.save(f, columns)
+        os.replace(newName + '.tmp', newName)
+        with open(metaName + '.tmp', 'w') as f:
+            json.dump({'signature': signature, 'offset': offset, 
+                       'shape': list(columns.shape), 'cache': os.path.basename(newName),
+                       'sketches': [sketch.toDict() for sketch in sketches or []]}, f)
+        os.replace(metaName + '.tmp', metaName)
+    except OSError as err:
+        print("Save cache of %s error: %s" % (fileName, str(err)))
+        return
+    # remove the old versions, the mapped ones are removed by the next save.
+    for oldName in glob.glob(glob.escape(fileName) + '.*' + CACHE_EXT) + [cacheName]:
+        version = oldName[len(fileName)+1:-len(CACHE_EXT)]
+        if oldName == newName or not (version.isdigit() or oldName == cacheName): continue
+        if not os.path.isfile(oldName): continue
+        try:
+            os.remove(oldName)
+        except OSError:
+            pass
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class quantileSketch(object):
+    """ t-digest style mergeable quantile sketch. The values are summarised as 
+        weighted centroids, the centroid size is limited by the arcsin scale 
+        function so the centroids near the two tails are tiny and the tail 
+        quantile (such as 99.9%) stays accurate. The values are added in numpy 
+        batches and the compression is vectorized, the sketch size is about 
+        delta/2 centroids whatever the number of values.
+    """
+    def __init__(self, delta=SKETCH_DELTA):
+        self.delta = delta
+        self.count = 0      # number of the input values.
+        self.minVal = self.maxVal = None
+        self.means = np.zeros(0, dtype=float)
+        self.weights = np.zeros(0, dtype=float)
+
+#--quantileSketch--------------------------------------------------------------
+    def _compress(self, means, weights):
+        """ Merge the sorted centroids which fall in the same unit of the scale
+            function k(q) = delta/(2*pi)*asin(2q-1).
+        """
+        order = np.argsort(means, kind='stable')
+        self.means, self.weights = self._cluster(means[order], weights[order])
+
+#--quantileSketch--------------------------------------------------------------
+    def _cluster(self, means, weights=None):
+        """ Return the (means, weights) of the sorted values (unit weights if
+            <weights> is None) merged in the units of the scale function.
+        """
+        if weights is None:
+            # the unit weight value i has q = (i+0.5)/num, so the units' start
+            # indexes come from the O(delta) unit edges k = j instead.
+            num = len(means)
+            edges = np.arange(np.floor(-self.delta/4), np.ceil(self.delta/4) + 1)
+            edgeQ = (np.sin(2*np.pi*edges/self.delta) + 1)/2
+            starts = np.unique(np.clip(np.ceil(edgeQ*num - 0.5), 0, num - 1).astype(np.int64))
+            starts = np.r_[0, starts[starts > 0]]
+            newWeights = np.diff(np.r_[starts, num]).astype(float)
+            return np.add.reduceat(means, starts, dtype=float)/newWeights, newWeights
+        midQ = (np.cumsum(weights) - weights/2)/weights.sum()
+        cluster = np.floor(self.delta/(2*np.pi)*np.arcsin(np.clip(2*midQ-1, -1, 1)))
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        newWeights = np.add.reduceat(weights, starts)
+        return np.add.reduceat(means*weights, starts)/newWeights, newWeights
+
+#--quantileSketch--------------------------------------------------------------
+    def update(self, values):
+        """ Add the values array to the sketch. The values are sorted in their
+            own data type (fast for the int32 delay columns) and clustered 
+            first, only the small centroid lists are merged with the sketch.
+        """
+        if len(values) == 0: return
+        values = np.sort(np.asarray(values))
+        minVal, maxVal = float(values[0]), float(values[-1])
+        self.minVal = minVal if self.minVal is None else min(self.minVal, minVal)
+        self.maxVal = maxVal if self.maxVal is None else max(self.maxVal, maxVal)
+        self.count += len(values)
+        means, weights = self._cluster(values)
+        if len(self.means) == 0:
+            self.means, self.weights = means, weights
+        else:
+            self._compress(np.concatenate((self.means, means)), np.concatenate((self.weights, weights)))
+
+#--quantileSketch--------------------------------------------------------------
+    def merge(self, other):
+        """ Merge the other sketch into this sketch."""
+        if other.count == 0: return
+        self.minVal = other.minVal if self.minVal is None else min(self.minVal, other.minVal)
+        self.maxVal = other.maxVal if self.maxVal is None else max(self.maxVal, other.maxVal)
+        self.count += other.count
+        self._compress(np.concatenate((self.means, other.means)), 
+                       np.concatenate((self.weights, other.weights)))
+
+#--quantileSketch--------------------------------------------------------------
+    def quantile(self, q):
+        """ Return the estimated q (0.0 - 1.0) quantile value, None if empty."""
+        if self.count == 0: return None
+        cumWeights = np.cumsum(self.weights)
+        midRanks = cumWeights - self.weights/2
+        return float(np.interp(q*cumWeights[-1], np.r_[0, midRanks, cumWeights[-1]], 
+                               np.r_[self.minVal, self.means, self.maxVal]))
+
+#--quantileSketch--------------------------------------------------------------
+    def toDict(self):
+        """ Return the json serializable dict of the sketch."""
+        return {'delta': self.delta, 'count': self.count, 
+                'min': self.minVal, 'max': self.maxVal,
+                'means': self.means.tolist(), 'weights': self.weights.tolist()}
+
+#--quantileSketch--------------------------------------------------------------
+    @classmethod
+    def fromDict(cls, data):
+        """ Create the sketch from the dict made by toDict()."""
+        sketch = cls(delta=data['delta'])
+        sketch.count, sketch.minVal, sketch.maxVal = data['count'], data['min'], data['max']
+        sketch.means = np.array(data['means'], dtype=float)
+        sketch.weights = np.array(data['weights'], dtype=float)
+        return sketch
+
+#--quantileSketch--------------------------------------------------------------
+    @classmethod
+    def mergeAll(cls, sketches, delta=SKETCH_DELTA):
+        """ Return a new sketch merged from the sketches list."""
+        merged = cls(delta=delta)
+        for sketch in sketches: merged.merge(sketch)
+        return merged
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class windowHistograms(object):
+    """ Ring of the per time bucket histograms keyed by the row timestamp
+        (microseconds): bucket n counts the rows whose timestamp is in 
+        [n*bucketTime, (n+1)*bucketTime), only the newest <bucketNum> buckets 
+        are kept and the older rows are dropped. A bucket is only created when
+        it has rows and keeps one WINDOW_WIDTH bin width histogram per delay 
+        type in the sparse form (sorted flat bin index, count) arrays, so the
+        memory is in O(used bins) instead of O(buckets x PYRAMID_BIN_NUM). The 
+        bucket arrays are replaced (never changed in place) by add(), so a
+        snapshot shares them with the ring.
+    """
+    def __init__(self, bucketNum, bucketTime=BUCKET_TIME):
+        self.bucketNum = bucketNum
+        self.bucketTime = bucketTime
+        self.lastId = -1    # newest bucket id (timestamp//bucketTime).
+        self.buckets = {}   # {bucket id: (flat bin index array, count array)}.
+
+#--windowHistograms------------------------------------------------------------
+    def add(self, times, columns):
+        """ Count the rows' (timestamps, delay type columns) in their buckets,
+            the buckets older than the newest <bucketNum> buckets are dropped.
+        """
+        if len(times) == 0: return
+        ids = times // self.bucketTime
+        self.lastId = max(self.lastId, int(ids.max()))
+        keep = ids > self.lastId - self.bucketNum
+        if not keep.all(): ids, columns = ids[keep], columns[:, keep]
+        for bucketId in [bucketId for bucketId in self.buckets if bucketId <= self.lastId - self.bucketNum]:
+            del self.buckets[bucketId]
+        if len(ids) == 0: return
+        newIds, bucketIdx = np.unique(ids, return_inverse=True)
+        binSize = PYRAMID_BIN_NUM + 1
+        flatIdx = np.empty((TYPE_NUM, len(ids)), dtype=np.int64)
+        for typeIdx, column in enumerate(columns):
+            binIdx = column // WINDOW_WIDTH
+            binIdx[(binIdx < 0) | (binIdx >= PYRAMID_BIN_NUM)] = PYRAMID_BIN_NUM
+            flatIdx[typeIdx] = (bucketIdx*TYPE_NUM + typeIdx)*binSize + binIdx
+        flatIdx, counts = np.unique(flatIdx.ravel(), return_counts=True)
+        # the sorted flat index is split at the bucket boundaries.
+        cuts = np.searchsorted(flatIdx, np.arange(len(newIds)+1)*TYPE_NUM*binSize)
+        for idx, bucketId in enumerate(newIds.tolist()):
+            binIdx = (flatIdx[cuts[idx]:cuts[idx+1]] - idx*TYPE_NUM*binSize).astype(WINDOW_DTYPE)
+            binCounts = counts[cuts[idx]:cuts[idx+1]].astype(WINDOW_DTYPE)
+            if bucketId in self.buckets:
+                oldIdx, oldCounts = self.buckets[bucketId]
+                binIdx, inverse = np.unique(np.concatenate((oldIdx, binIdx)), return_inverse=True)
+                binCounts = np.bincount(inverse, weights=np.concatenate((oldCounts, binCounts)),
+                                        minlength=len(binIdx)).astype(WINDOW_DTYPE)
+            self.buckets[bucketId] = (binIdx, binCounts)
+
+#--windowHistograms------------------------------------------------------------
+    def getHistograms(self, windowTime, binWidth=BIN_WIDTH, binNum=BIN_NUM, typeIdx=None, endTime=None):
+        """ Return the histograms (of the <typeIdx> type if given) of the rows
+            in the last <windowTime> (microseconds) buckets before the end time
+            (default: the newest bucket), the last bin counts the out of range 
+            delays. Return None if the bin view can not be merged from the 
+            WINDOW_WIDTH histograms.
+        """
+        levelInfo = pickPyramidLevel(binWidth, binNum, widths=(WINDOW_WIDTH,))
+        if levelInfo is None: return None
+        factor = levelInfo[1]
+        lastId = self.lastId if endTime is None else endTime//self.bucketTime
+        bucketNum = max(1, -(-windowTime//self.bucketTime))
+        used = [bins for bucketId, bins in self.buckets.items() if lastId - bucketNum < bucketId <= lastId]
+        binSize = PYRAMID_BIN_NUM + 1
+        counts = np.zeros(TYPE_NUM*binSize, dtype=COUNT_DTYPE)
+        if used:
+            counts += np.bincount(np.concatenate([bins[0] for bins in used]),
+                                  weights=np.concatenate([bins[1] for bins in used]),
+                                  minlength=TYPE_NUM*binSize).astype(COUNT_DTYPE)
+        counts = counts.reshape(TYPE_NUM, binSize)
+        hists = mergeBins(counts if typeIdx is None else counts[typeIdx:typeIdx+1], factor, binNum)
+        return hists if typeIdx is None else hists[0]
+
+#--windowHistograms------------------------------------------------------------
+    def snapshot(self):
+        """ Return a copy of the ring which is not changed by the later adds, 
+            the bucket arrays are shared as they are never changed in place.
+        """
+        window = copy.copy(self)
+        window.buckets = dict(self.buckets)
+        return window
+
+#-----------------------------------------------------------------------------
+def buildSketches(columns, delta=SKETCH_DELTA):
+    """ Build the quantile sketch of each delay type column."""
+    sketches = [quantileSketch(delta=delta) for _ in range(len(columns))]
+    for sketch, column in zip(sketches, columns): sketch.update(column)
+    return sketches
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class csvDataFile(object):
+    """ Parsed data of one NetFetcher CSV file. The object remembers the parsed
+        byte offset and row count of the file, so when the experiment appends 
+        rows to the file, update() only parses the new complete lines and 
+        appends them to the delay type columns, the histogram pyramid and the
+        quantile sketches.
+        In the out-of-core mode (for the file bigger than the memory), the file
+        is streamed chunk by chunk, all the pyramid levels and the sketches are
+        counted from the chunks and only a bounded reservoir sample of the rows
+        is kept as the columns, the sidecar cache is not used.
+        If <windowNum> is set, the rows are also counted in the time window 
+        buckets (the last windowNum*BUCKET_TIME of the row timestamps), the 
+        file is streamed and the sidecar cache (no timestamps) is not used.
+    """
+    def __init__(self, fileName, useCache=True, binWidth=BIN_WIDTH, binNum=BIN_NUM,
+                 outOfCore=False, reservoirNum=RESERVOIR_NUM, windowNum=0):
+        self.fileName = fileName
+        self.useCache = useCache and not outOfCore and not windowNum
+        self.outOfCore = outOfCore
+        self.reservoirNum = reservoirNum    # max rows kept in the out-of-core mode.
+        self.rng = np.random.default_rng()  # random generator of the reservoir.
+        self.binWidth = binWidth    # default histograms' bin width (microseconds).
+        self.binNum = binNum        # default histograms' bin number.
+        self.offset = 0     # parsed byte offset of the file.
+        self.rowNum = 0     # parsed row count of the file.
+        self.inode = None   # file inode, changed if the file is replaced.
+        self.mtime = None   # file mtime when all the file is parsed, changed if
+                            # the file is modified in place.
+        self._buffer = rowsToColumns(np.zeros((0, ROW_LEN), dtype=ROW_DTYPE))
+        self.pyramid = self._emptyPyramid() # histogram pyramid levels.
+        self.sketches = buildSketches(self._buffer)
+        self.windowNum = windowNum
+        self.window = windowHistograms(windowNum) if windowNum else None
+
+#--csvDataFile-----------------------------------------------------------------
+    def _emptyPyramid(self):
+        """ Return the empty pyramid levels: the levels are built from the columns
+            on first use, in the out-of-core mode all levels are counted from
+            the chunks.
+        """
+        if not self.outOfCore: return [None]*len(PYRAMID_WIDTHS)
+        return [np.zeros((TYPE_NUM, PYRAMID_BIN_NUM+1), dtype=COUNT_DTYPE) for _ in PYRAMID_WIDTHS]
+
+#--csvDataFile-----------------------------------------------------------------
+    def __getstate__(self):
+        """ Pickle state (the object is returned from the process pool worker),
+            the memory mapped cache columns are re-mapped instead of copied.
+        """
+        state = self.__dict__.copy()
+        if isinstance(self._buffer, np.memmap): 
+            state['_buffer'] = self._buffer.filename # the cache version file.
+        return state
+
+#--csvDataFile-----------------------------------------------------------------
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self._buffer, str):
+            self._buffer = np.load(self._buffer, mmap_mode='r')
+
+#--csvDataFile-----------------------------------------------------------------
+    @property
+    def columns(self):
+        """ (TYPE_NUM, rowNum) delay type columns of the parsed rows, in the 
+            out-of-core mode the columns of the reservoir sampled rows.
+        """
+        return self._buffer[:, :min(self.rowNum, self._buffer.shape[1])]
+
+#--csvDataFile-----------------------------------------------------------------
+    @property
+    def hists(self):
+        """ (TYPE_NUM, binNum+1) histograms of the default bin width."""
+        return self.getHistograms()
+
+#--csvDataFile-----------------------------------------------------------------
+    def getHistograms(self, binWidth=None, binNum=None, typeIdx=None):
+        """ Return the histograms (of the <typeIdx> type if given) of the bin 
+            width and number, the last bin counts the out of range delays. The 
+            histograms are picked from the pyramid, the columns are re-binned 
+            only if no pyramid level can be used (in the out-of-core mode the
+            reservoir's counts are scaled up to the row number, an estimate).
+        """
+        binWidth = self.binWidth if binWidth is None else binWidth
+        binNum = self.binNum if binNum is None else binNum
+        levelInfo = pickPyramidLevel(binWidth, binNum)
+        if levelInfo is None:
+            columns = self.columns if typeIdx is None else self.columns[typeIdx:typeIdx+1]
+            hists = buildHistograms(columns, binWidth, binNum)
+            if columns.shape[1] and columns.shape[1] < self.rowNum:
+                hists = np.rint(hists*(self.rowNum/columns.shape[1])).astype(COUNT_DTYPE)
+        else:
+            level, factor = levelInfo
+            if self.pyramid[level] is None:
+                self.pyramid[level] = buildHistograms(self.columns, PYRAMID_WIDTHS[level], PYRAMID_BIN_NUM)
+            hists = self.pyramid[level] if typeIdx is None else self.pyramid[level][typeIdx:typeIdx+1]
+            hists = mergeBins(hists, factor, binNum)
+        return hists if typeIdx is None else hists[0]
+
+#--csvDataFile-----------------------------------------------------------------
+    def _append(self, columns, times=None):
+        """ Append the new parsed columns (and count them in the time window by
+            their timestamps), the buffer capacity is doubled when it is full 
+            so appending n rows costs amortized O(n).
+        """
+        newNum = self.rowNum + columns.shape[1]
+        if self.outOfCore:
+            self._sampleReservoir(columns)
+        elif newNum > self._buffer.shape[1] or not self._buffer.flags.writeable:
+            buffer = np.empty((TYPE_NUM, max(newNum, 2*self.rowNum)), dtype=DATA_DTYPE)
+            buffer[:, :self.rowNum] = self.columns
+            self._buffer = buffer
+        if not self.outOfCore: self._buffer[:, self.rowNum:newNum] = columns
+        self.rowNum = newNum
+        for level, hists in enumerate(self.pyramid):
+            if hists is not None:
+                hists += buildHistograms(columns, PYRAMID_WIDTHS[level], PYRAMID_BIN_NUM)
+        for sketch, column in zip(self.sketches, columns): sketch.update(column)
+        if self.window is not None and times is not None: self.window.add(times, columns)
+
+#--csvDataFile-----------------------------------------------------------------
+    def _sampleReservoir(self, columns):
+        """ Reservoir sample (algorithm R) the new parsed columns, every parsed
+            row has the same chance to be kept in the reservoir.
+        """
+        if self._buffer.shape[1] < self.reservoirNum:
+            buffer = np.empty((TYPE_NUM, self.reservoirNum), dtype=DATA_DTYPE)
+            buffer[:, :self.rowNum] = self.columns
+            self._buffer = buffer
+        # fill the empty reservoir slots first.
+        fillNum = max(0, min(self.reservoirNum - self.rowNum, columns.shape[1]))
+        self._buffer[:, self.rowNum:self.rowNum+fillNum] = columns[:, :fillNum]
+        # row n (0-based) replaces a random slot with the chance reservoirNum/(n+1).
+        rowIdx = np.arange(self.rowNum+fillNum, self.rowNum+columns.shape[1])
+        slots = self.rng.integers(0, rowIdx+1) if len(rowIdx) else rowIdx
+        keep = slots < self.reservoirNum
+        self._buffer[:, slots[keep]] = columns[:, fillNum:][:, keep]
+
+#--csvDataFile-----------------------------------------------------------------
+    def load(self, progress=None):
+        """ Fully load the file: use the sidecar cache if it is valid, otherwise
+            parse the CSV file and rebuild the cache. In the out-of-core and the
+            time window mode the file is streamed chunk by chunk. 
+            progress - callback function progress(parsedBytes, fileBytes).
+        """
+        stat = os.stat(self.fileName)
+        self.inode = stat.st_ino
+        if self.outOfCore or self.windowNum:
+            self._buffer = rowsToColumns(np.zeros((0, ROW_LEN), dtype=ROW_DTYPE))
+            self.rowNum, self.offset = 0, 0
+            self.pyramid, self.sketches = self._emptyPyramid(), buildSketches(self._buffer)
+            if self.windowNum: self.window = windowHistograms(self.windowNum)
+            for rows, self.offset in iterCSVRows(self.fileName):
+                if len(rows): self._append(rowsToColumns(rows), rows[:, 0])
+                if progress: progress(self.offset, stat.st_size)
+            self._syncMtime(stat)
+            return
+        cache = loadCachedColumns(self.fileName) if self.useCache else None
+        if cache is None:
+            signature = _fileSignature(self.fileName) # take it before parsing.
+            columns, offset = parseCSVFile(self.fileName, progress=progress)
+            sketches = buildSketches(columns)
+            if self.useCache: 
+                saveCachedColumns(self.fileName, columns, signature, offset, sketches)
+        else:
+            columns, meta = cache
+            offset = meta['offset']
+            sketches = [quantileSketch.fromDict(data) for data in meta.get('sketches', [])]
+            if len(sketches) != TYPE_NUM: sketches = buildSketches(columns)
+        self._buffer, self.rowNum, self.offset = columns, columns.shape[1], offset
+        self.pyramid = self._emptyPyramid()
+        self.sketches = sketches
+        self._syncMtime(stat)
+
+#--csvDataFile-----------------------------------------------------------------
+    def _syncMtime(self, stat):
+        """ Remember the file mtime of the stat taken before parsing if the file
+            is parsed to the end of that stat.
+        """
+        self.mtime = stat.st_mtime_ns if self.offset == stat.st_size else None
+
+#--csvDataFile-----------------------------------------------------------------
+    def update(self, progress=None):
+        """ Parse the rows appended since the last load/update. The file will be
+            fully reloaded if it is replaced, truncated or modified in place (same
+            size, mtime changed). Return the number of new rows, -1 if the file 
+            is fully reloaded.
+        """
+        stat = os.stat(self.fileName)
+        if self.inode != stat.st_ino or stat.st_size < self.offset or (
+                stat.st_size == self.offset and self.mtime not in (None, stat.st_mtime_ns)):
+            self.load(progress=progress)
+            return -1
+        if stat.st_size == self.offset: return 0
+        rowNum = self.rowNum
+        for rows, self.offset in iterCSVRows(self.fileName, offset=self.offset):
+            if len(rows): self._append(rowsToColumns(rows), rows[:, 0])
+        self._syncMtime(stat)
+        return self.rowNum - rowNum
+
+#--csvDataFile-----------------------------------------------------------------
+    def appendLines(self, lines, header=True):
+        """ Append the streamed CSV lines (bytes with the line end) of the file 
+            being written by the experiment. If <header> is True, the first line
+            of the file is skipped if it is a header (not a data row). Return 
+            the number of new rows.
+        """
+        if header and self.offset == 0 and lines and isHeaderLine(lines[0]):
+            self.offset, lines = len(lines[0]), lines[1:]
+        self.offset += sum(len(line) for line in lines)
+        rows = parseRows(lines)
+        if len(rows): self._append(rowsToColumns(rows), rows[:, 0])
+        return len(rows)
+
+#--csvDataFile-----------------------------------------------------------------
+    def snapshot(self):
+        """ Return a copy of the parsed data which is not changed by the later
+            appends, so the data can be handed to the other threads.
+        """
+        data = copy.copy(self)
+        data._buffer = self.columns.copy()
+        data.pyramid = [None if hists is None else hists.copy() for hists in self.pyramid]
+        data.sketches = copy.deepcopy(self.sketches)
+        data.window = None if self.window is None else self.window.snapshot()
+        return data
+
+#--csvDataFile-----------------------------------------------------------------
+    def syncFile(self):
+        """ Take the file written with the streamed lines as parsed, so update()
+            does not parse it again. Return False if the file is not the same 
+            size as the streamed lines (it will be reloaded by update()).
+        """
+        try:
+            stat = os.stat(self.fileName)
+        except OSError:
+            return False
+        if stat.st_size != self.offset: return False
+        self.inode = stat.st_ino
+        self._syncMtime(stat)
+        return True
+
+#-----------------------------------------------------------------------------
+def loadDataFile(fileName, useCache=True, binNum=BIN_NUM, outOfCore=False, windowNum=0):
+    """ Process pool job: create and load the csvDataFile of the file."""
+    dataFile = csvDataFile(fileName, useCache=useCache, binNum=binNum, outOfCore=outOfCore,
+                           windowNum=windowNum)
+    dataFile.load()
+    return dataFile
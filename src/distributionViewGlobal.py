@@ -26,6 +26,8 @@ MODE_F_PATH = os.path.join(dirpath, 'model', '*.csv')
 DATA_F_PATH = os.path.join(dirpath, 'data', '*.csv')
 # The config file for the netfetcher program.
 CONFIG_FILE = ("model_scripted_exp.bat", "check_scripted_exp.bat")
+# The experiment run program (NetFetcher verifier).
+VERIFIER_CMD = os.path.join(dirpath, 'verifier.exe' if WINP else 'verifier')
 # The experiment config data.
 # Format: [IP Address, Port Num, File ID, Block Num, Iterations, Output File]
 EXP_CONFIG = (('127.0.0.1', '5555', 'file_20180617.dat', '1024', '99999', 'exp-localHost.csv'),
@@ -47,3 +49,16 @@ iDataType = 5       # Data Type currently displayed
 iUpdateRate = 2     # Time period to update the 
 iLineStyle = 1      # width of the chart line
 iMatchFlag = False  # whether we do match function. 
+iCacheFlag = True   # whether we use the sidecar cache of the parsed CSV file.
+iTailFollow = True  # whether we watch the model/data folders' added, removed and changed files.
+iPollRate = 4       # Time period(sec) to poll the folder files, increased for big folders.
+iWorkerNum = 0      # number of the worker processes, 0 - use all the CPU cores.
+iOutOfCoreSize = 1 << 30 # CSV file bigger than this size(bytes) is streamed in chunks, 0 - disable.
+iExpRunFlag = False # whether the setup panel runs the experiment script by the verifier.
+iExpLimit = 1       # max experiments running at the same time on one target(ip:port).
+iExpTimeout = 0     # experiment run timeout(sec), 0 - no timeout.
+iExpStream = True   # whether the experiment output rows are displayed while it runs.
+iListenHost = '127.0.0.1' # live latency rows listener IP address.
+iListenPort = 0     # live latency rows listener UDP/TCP port, 0 - disable.
+iWindowNum = 0      # 1 sec time window buckets kept by each CSV file, 0 - disable (the 
+                    # files with the window are streamed, the sidecar cache is not used).
@@ -0,0 +1,252 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewListener.py
+#
+# Purpose:     This module is used to collect the NetFetcher latency rows sent
+#              by the probes over the network: a UDP/TCP listener thread reads
+#              the CSV rows (same six columns as the CSV file, no header) from
+#              all the probes, parses them in batches into the delay columns,
+#              the histogram pyramid and the quantile sketches, and publishes
+#              a data snapshot periodically. The snapshot is replaced as one
+#              reference (no lock), the data manager shows it as the first data
+#              set (live://<host>:<port>) of the [data] panel.
+#              A stand-in probe generator is provided to test the listener.
+#
+#              Usage example:
+#              python distributionViewListener.py listen --port 5600
+#              python distributionViewListener.py gen --port 5600 --rate 100000
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import sys
+import time
+import socket
+import argparse
+import selectors
+import threading
+import numpy as np
+
+import distributionViewData as dvd
+
+LISTEN_PORT = 5600      # default UDP/TCP listen port.
+RECV_SIZE = 1 << 16     # max bytes read from the socket at one time.
+UDP_DRAIN = 256         # max datagrams read in one socket readable event.
+BATCH_ROWS = 20000      # max rows waiting to be parsed together in one batch.
+BATCH_PERIOD = 0.1      # max time(sec) the received rows wait to be parsed.
+SNAPSHOT_PERIOD = 0.5   # time(sec) between two published data snapshots.
+LIVE_RESERVOIR = 1 << 16    # rows of the reservoir sample kept by the listener.
+GEN_POOL = 100000       # rows pre-generated and sent in cycle by the generator.
+GEN_TICK = 0.01         # time(sec) of one generator sending period.
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class latencyListener(threading.Thread):
+    """ Thread to receive the latency rows from the UDP datagrams (one or more
+        complete lines per datagram) and the TCP connections (line stream) on
+        the same port. All the received rows are counted in one data set:
+        the out-of-core csvDataFile (bounded memory: all the pyramid levels and
+        a reservoir sample of the rows, the <windowNum> time window buckets if
+        it is set). The last data snapshot is read from the <snapshot> 
+        attribute, None before the first rows are received.
+    """
+    def __init__(self, host='127.0.0.1', port=LISTEN_PORT, udp=True, tcp=True, windowNum=0):
+        threading.Thread.__init__(self, name='latencyListener', daemon=True)
+        self.selector = selectors.DefaultSelector()
+        if udp:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+            self._bind(sock, host, port, self._readUDP)
+            port = sock.getsockname()[1]    # the port picked if the port is 0.
+        if tcp:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._bind(sock, host, port, self._accept)
+            sock.listen(64)
+            port = sock.getsockname()[1]
+        self.host, self.port = host, port
+        self.dataFile = dvd.csvDataFile('live://%s:%d' % (host, port), useCache=False,
+                                        outOfCore=True, reservoirNum=LIVE_RESERVOIR,
+                                        windowNum=windowNum)
+        self.snapshot = None    # last published data snapshot (dvd.csvDataFile).
+        self.blobs = []         # received complete lines waiting to be parsed.
+        self.blobRows = 0       # number of the rows waiting to be parsed.
+        self.carry = {}         # {TCP connection: incomplete last line}.
+        self.terminate = False
+
+#--latencyListener-------------------------------------------------------------
+    def _bind(self, sock, host, port, handler):
+        """ Bind the non-blocking socket and register its read handler."""
+        sock.bind((host, port))
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, handler)
+
+#--latencyListener-------------------------------------------------------------
+    def _readUDP(self, sock):
+        """ Read the waiting datagrams, a datagram has one or more rows."""
+        for _ in range(UDP_DRAIN):
+            try:
+                data = sock.recv(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue    # such as the ICMP error of the former send.
+            if not data.endswith(b'\n'): data += b'\n'
+            self.blobs.append(data)
+            self.blobRows += data.count(b'\n')
+
+#--latencyListener-------------------------------------------------------------
+    def _accept(self, sock):
+        """ Accept the probe's TCP connection."""
+        try:
+            conn, _ = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        self.carry[conn] = b''
+        self.selector.register(conn, selectors.EVENT_READ, self._readTCP)
+
+#--latencyListener-------------------------------------------------------------
+    def _readTCP(self, conn):
+        """ Read the TCP line stream, the incomplete last line is kept until
+            its line end is received.
+        """
+        try:
+            data = conn.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.selector.unregister(conn)
+            conn.close()
+            data = self.carry.pop(conn)
+            if data: self.blobs.append(data + b'\n')
+            return
+        data = self.carry[conn] + data
+        cut = data.rfind(b'\n') + 1
+        self.carry[conn] = data[cut:]
+        if cut:
+            self.blobs.append(data[:cut])
+            self.blobRows += data.count(b'\n', 0, cut)
+
+#--latencyListener-------------------------------------------------------------
+    def _parseBatch(self):
+        """ Parse all the waiting rows together and add them to the data set."""
+        data, self.blobs, self.blobRows = b''.join(self.blobs), [], 0
+        self.dataFile.appendLines(data.splitlines(keepends=True), header=False)
+
+#--latencyListener-------------------------------------------------------------
+    def run(self):
+        """ Listener main loop: read the sockets, parse the rows in batches and
+            publish the data snapshot.
+        """
+        batchT = snapshotT = time.monotonic()
+        publishNum = 0
+        while not self.terminate:
+            for key, _ in self.selector.select(BATCH_PERIOD):
+                key.data(key.fileobj)
+                if self.blobRows >= BATCH_ROWS: break
+            now = time.monotonic()
+            if self.blobs and (self.blobRows >= BATCH_ROWS or now - batchT >= BATCH_PERIOD):
+                self._parseBatch()
+                batchT = now
+            if now - snapshotT >= SNAPSHOT_PERIOD and self.dataFile.rowNum != publishNum:
+                self.snapshot = self.dataFile.snapshot() # replace the reference only.
+                publishNum, snapshotT = self.dataFile.rowNum, now
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+#--latencyListener-------------------------------------------------------------
+    def stop(self):
+        """ Stop the listener and close the sockets."""
+        self.terminate = True
+
+#-----------------------------------------------------------------------------
+def genLines(rowNum, seed=0):
+    """ Generate <rowNum> stand-in probe rows (the NetFetcher CSV row format),
+        return the list of the row lines (bytes).
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.empty((rowNum, dvd.ROW_LEN), dtype=np.int64)
+    rows[:, 0] = 1559985507532879 + np.arange(rowNum)*10
+    for idx, scale in enumerate((150, 3000, 3000, 2000, 120000)):
+        rows[:, idx+1] = rng.lognormal(np.log(scale), 0.5, rowNum)
+    return [('%d,%d,%d,%d,%d,%d\n' % tuple(row)).encode() for row in rows.tolist()]
+
+#-----------------------------------------------------------------------------
+def sendRows(host='127.0.0.1', port=LISTEN_PORT, proto='udp', rate=100000,
+             duration=10, rowsPerPacket=50, seed=0):
+    """ Stand-in probe: send the generated rows to the listener at <rate> rows
+        per second for <duration> seconds, <rowsPerPacket> rows per UDP
+        datagram or TCP send. Return the number of rows sent.
+    """
+    lines = genLines(GEN_POOL, seed=seed)
+    # the pool is cut to whole packets, so every packet has <rowsPerPacket> rows.
+    packets = [b''.join(lines[idx:idx+rowsPerPacket]) 
+               for idx in range(0, GEN_POOL - rowsPerPacket + 1, rowsPerPacket)]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if proto == 'udp' else socket.SOCK_STREAM)
+    if proto == 'tcp': sock.connect((host, port))
+    sendNum, pktIdx, startT = 0, 0, time.monotonic()
+    try:
+        while True:
+            usedT = time.monotonic() - startT
+            if usedT >= duration: break
+            # send the packets due until the next tick.
+            dueNum = int(min(duration, usedT + GEN_TICK)*rate) - sendNum
+            for _ in range(max(0, dueNum)//rowsPerPacket):
+                if proto == 'udp':
+                    sock.sendto(packets[pktIdx], (host, port))
+                else:
+                    sock.sendall(packets[pktIdx])
+                pktIdx = (pktIdx + 1) % len(packets)
+                sendNum += rowsPerPacket
+            time.sleep(max(0, startT + usedT + GEN_TICK - time.monotonic()))
+    finally:
+        sock.close()
+    return sendNum
+
+#-----------------------------------------------------------------------------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Live latency rows listener and the stand-in probe generator.')
+    ap.add_argument('mode', choices=('listen', 'gen'), help='listen - run the listener, gen - send the rows.')
+    ap.add_argument('--host', default='127.0.0.1', help='Listen/send IP address.')
+    ap.add_argument('--port', type=int, default=LISTEN_PORT, help='UDP/TCP port.')
+    ap.add_argument('--proto', choices=('udp', 'tcp'), default='udp', help='Generator protocol.')
+    ap.add_argument('--rate', type=int, default=100000, help='Generator rows per second.')
+    ap.add_argument('--duration', type=float, default=None, 
+                    help='Running time (sec), default: generator 10 s, listener until Ctrl+C.')
+    ap.add_argument('--packet-rows', type=int, default=50, help='Generator rows per datagram/send.')
+    args = ap.parse_args(argv)
+    if args.mode == 'gen':
+        startT = time.monotonic()
+        sendNum = sendRows(args.host, args.port, args.proto, args.rate, 
+                           args.duration or 10, args.packet_rows)
+        print("Sent %d rows in %.1f s" % (sendNum, time.monotonic() - startT))
+        return 0
+    listener = latencyListener(args.host, args.port)
+    listener.start()
+    print("Listening on %s:%d (UDP/TCP)" % (listener.host, listener.port))
+    lastNum, startT = 0, time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - startT < args.duration:
+            time.sleep(1)
+            snapshot = listener.snapshot
+            rowNum = 0 if snapshot is None else snapshot.rowNum
+            print("rows: %d  (%d rows/s)" % (rowNum, rowNum - lastNum))
+            lastNum = rowNum
+    except KeyboardInterrupt:
+        pass
+    listener.stop()
+    listener.join()
+    return 0
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
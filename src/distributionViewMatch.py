@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewMatch.py
+#
+# Purpose:     This module is used to provide the data match (ROC threshold
+#              search) functions of the distributionViewer. The module does not
+#              import wx, so the match job can be run in the worker processes
+#              of a process pool.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+
+#-----------------------------------------------------------------------------
+def dataCut(d1, d2):
+    """ Cuart the data set to positive and negative, return the 2 arrays of
+        the samples in the window (lower mean - win, higher mean + win).
+    """
+    e1, e2 = np.asarray(d1), np.asarray(d2)
+    if e1.mean() > e2.mean():
+        e1, e2 = e2, e1
+    win = min(e1.std(), e2.std())
+    lowB, upB = e1.mean() - win, e2.mean() + win
+    return e1[(e1 > lowB) & (e1 < upB)], e2[(e2 > lowB) & (e2 < upB)]
+
+#-----------------------------------------------------------------------------
+def learnClass(d1, d2,  resolution=100, exact=False, verbose=False):
+    """ Get the relate COG different calcualtion result. d1 is the negative
+        class, d2 is the positive class. Both samples are sorted once and the
+        tp/tn/fp/fn of every moving threshold are counted with searchsorted,
+        so the cost is O(n*log(n) + resolution). If <exact> is True, every
+        distinct sample value between the two means is used as a threshold.
+    """
+    min_best_iter = max_best_iter = b_fp = b_fn = 1
+    min_best_thresh = max_best_thresh = b_tp = b_tn = 0
+    the_thresh = [(0.0, 0.0, 0.0)]
+    e1, e2 = np.sort(np.asarray(d1)), np.sort(np.asarray(d2))
+    best_sens = b_tp/(b_tp + b_fn)
+    best_spec = b_tn/(b_tn + b_fp)
+    lb, ub = np.mean(e1), np.mean(e2)
+    if lb > ub: lb, ub = ub, lb
+    min_best_thresh = max_best_thresh = lb
+    the_thresh.append((lb, min_best_thresh, max_best_thresh))
+    # Build the moving thresholds list.
+    if exact:
+        threshList = np.unique(np.concatenate((e1, e2)))
+        threshList = threshList[(threshList > lb) & (threshList <= ub)].astype(float)
+    else:
+        threshList, moving_thresh, steps = [], lb, (ub - lb)/resolution
+        while moving_thresh <= ub:
+            moving_thresh += steps
+            threshList.append(moving_thresh)
+            if steps <= 0: break # the 2 data sets have the same mean.
+        threshList = np.array(threshList, dtype=float)
+    # Count the samples below each threshold (value < thresh is negative).
+    tnList = np.searchsorted(e1, threshList, side='left')
+    fnList = np.searchsorted(e2, threshList, side='left')
+    tpList, fpList = len(e2) - fnList, len(e1) - tnList
+    for iteration, (moving_thresh, c_tp, c_tn, c_fp, c_fn) in enumerate(zip(
+            threshList.tolist(), tpList.tolist(), tnList.tolist(), fpList.tolist(), fnList.tolist()), 1):
+        cur_sens = c_tp/(c_tp + c_fn)
+        cur_spec = c_tn/(c_tn + c_fp)
+        ### HERE is the fitness metric
+        if (cur_sens > best_sens and cur_spec >= best_spec) or (cur_sens >= best_sens and cur_spec > best_spec):
+            min_best_thresh = moving_thresh
+            max_best_thresh = moving_thresh
+            the_thresh.append((moving_thresh, moving_thresh, moving_thresh))
+            min_best_iter = iteration
+            max_best_iter = iteration
+            b_tp, b_tn, b_fp, b_fn = c_tp, c_tn, c_fp, c_fn
+            best_sens = b_tp/(b_tp + b_fn)
+            best_spec = b_tn/(b_tn + b_fp)
+        elif cur_sens == best_sens and cur_spec == best_spec:
+            max_best_thresh = moving_thresh
+            max_best_iter = iteration
+            the_thresh.append((moving_thresh, min_best_thresh, moving_thresh))
+        else:
+            the_thresh.append(
+                (moving_thresh, min_best_thresh, max_best_thresh))
+    if verbose:
+        print('Threshold search: %s thresholds evaluated.' % str(len(threshList)))
+    return min_best_thresh, min_best_iter, max_best_thresh, max_best_iter, b_tp, b_tn, b_fp, b_fn, the_thresh
+
+#-----------------------------------------------------------------------------
+def matchSamples(modelSample, dataSample):
+    """ Cut and match the model sample to the data sample, return the result
+        row of the match panel: (min threshold, max threshold, tp, tn, fp, fn,
+        sensitivity, specifity).
+    """
+    exp1_data, exp2_data = dataCut(modelSample, dataSample)
+    min_bt, _, max_bt, _, tp, tn, fp, fn, _ = learnClass(exp1_data, exp2_data)
+    return (min_bt, max_bt, tp, tn, fp, fn, tp/(tp+fn), tn/(tn+fp))
+
+#-----------------------------------------------------------------------------
+def createPool(workerNum=0):
+    """ Return the process pool of <workerNum> workers (0 - all the CPU cores).
+        The workers are spawned (not forked), as the pool is created from the
+        threaded data manager and a forked worker may get a lock held by the 
+        other threads. The shared memory resource tracker is started before 
+        the workers, so the workers use the same tracker as the main process 
+        and the shared memory they attached is not reported as leaked when 
+        they exit.
+    """
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(max_workers=workerNum or None,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+#-----------------------------------------------------------------------------
+def shareArrays(arrays):
+    """ Copy the arrays into one shared memory block, return the shared memory
+        and the (offset, length, dtype) spec list used by attachArray(). The
+        caller needs to close() and unlink() the shared memory after use.
+    """
+    specs, offset = [], 0
+    for array in arrays:
+        specs.append((offset, len(array), array.dtype.str))
+        offset += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, (offset, length, dtype) in zip(arrays, specs):
+        np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)[:] = array
+    return shm, specs
+
+#-----------------------------------------------------------------------------
+def attachArray(shm, spec):
+    """ Return the array view of the <spec> in the shared memory (no copy)."""
+    offset, length, dtype = spec
+    return np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+
+#-----------------------------------------------------------------------------
+def matchJob(shmName, modelSpec, dataSpec):
+    """ Process pool job: match the model sample to the data sample which are
+        shared in the shared memory <shmName>.
+    """
+    shm = shared_memory.SharedMemory(name=shmName)
+    try:
+        return matchSamples(attachArray(shm, modelSpec), attachArray(shm, dataSpec))
+    finally:
+        shm.close()
@@ -17,6 +17,7 @@
 import wx
 import time
 import wx.grid
+import numpy as np
 import distributionViewGlobal as gv
 
 #-----------------------------------------------------------------------------
@@ -42,29 +43,99 @@ class PanelChart(wx.Panel):
         self.times = [n for n in range(self.recNum//10)]  # X-Axis(time delay).
         self.maxCount = 0       # max count of the delay in the current data set.
         self.percentileScale = 1    # how many pixel scale will extend for x-Axis. 
+        self.binWidth = 1000        # data bin width (microseconds) for the x-Axis label.
+        self.binNum = recNum        # max bins number of the data sets.
         self.compareOverlay = False # Overlay the compare data.(compare data save in <self.dataD[-1]> )
         self.displayMode = 0        # 0 - Logarithmic scale, 1 - linear scale real, 2-linear scale fix
         self.logScale = (10, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000)
         self.logScaleShow = (1, 0, 1, 0, 0, 1, 0, 0, 1, 0) # 0 - hide, 1- show.
         self.labelInfo = ['Data1', 'Data2', 'Data3', 'exp-data[compare]']
+        self.bgBitmap = None    # off-screen bitmap of the chart background.
+        self.bgKey = None       # parameters the background bitmap is drawn with.
+        self.dataVer = [0]*dataSetNum   # data set version, increased when the data changed.
+        self.ptCache = {}       # data set idx -> (cache key, spline points list).
+        self.maxCountCache = (None, 0)  # (data versions, max count) of the data sets.
         self.Bind(wx.EVT_PAINT, self.onPaint)
         self.SetDoubleBuffered(True)
 
 #--PanelChart------------------------------------------------------------------     
     def _buildSplinePtList(self, data, idx):
         """ build the spline pixel points list based on the display mode."""
-        recNum, deltY = int(self.recNum*1.0/self.percentileScale), self.appSize[1]//200
+        # the data sets with more than recNum bins are compressed to the same
+        # width, so all the bins are shown (percentileScale zooms in).
+        binScale = self._getBinScale()
+        recNum, deltY = int(self.recNum*binScale/self.percentileScale), self.appSize[1]//200
+        data = np.asarray(data[:recNum], dtype=np.int64)
         if self.displayMode == 0:
-            return [(int(i*self.percentileScale*1.5)+idx, self._scaleCvrt(data[i])) for i in range(recNum)]
+            ptY = self._scaleCvrt(data)
         elif self.displayMode == 1:
-            return [(int(i*self.percentileScale*1.5)+idx, int(data[i])*200*deltY//self.maxCount) for i in range(recNum)]
+            ptY = data*200*deltY//self.maxCount
         elif self.displayMode == 2:
-            return [(int(i*self.percentileScale*1.5)+idx, min(200*deltY, int(data[i])*deltY)) for i in range(recNum)]
+            ptY = np.minimum(200*deltY, data*deltY)
+        else:
+            return None
+        ptX = (np.arange(len(data))*(self.percentileScale*1.5/binScale)).astype(np.int64) + idx
+        ptX, ptY = self._downSample(ptX, ptY)
+        return list(zip(ptX.tolist(), ptY.tolist()))
+
+#--PanelChart------------------------------------------------------------------     
+    def _downSample(self, ptX, ptY):
+        """ Min/max per pixel downsampling: only the min and max points (in the
+            original order) of each pixel column are kept, so the peaks are 
+            drawn with at most 2 points per pixel for any bins number.
+        """
+        starts = np.flatnonzero(np.diff(ptX)) + 1
+        if len(starts) + 1 == len(ptX): return ptX, ptY # one point per pixel.
+        starts = np.concatenate(([0], starts))
+        ends = np.concatenate((starts[1:], [len(ptX)])) - 1
+        # sort each pixel column's points by value, min first and max last.
+        order = np.lexsort((ptY, ptX))
+        keep = np.unique(np.concatenate((order[starts], order[ends], [0, len(ptX)-1])))
+        return ptX[keep], ptY[keep]
+
+#--PanelChart------------------------------------------------------------------
+    def _getBinScale(self):
+        """ Return the bins drawn in the x-Axis width of one bin of the recNum
+            bins view (1 if the data sets have no more than recNum bins).
+        """
+        return max(self.recNum, self.binNum)/self.recNum
 
 #--PanelChart------------------------------------------------------------------      
     def clearData(self):
         """ Clear all the times data to 0."""
         self.dataD = [[0]*self.recNum for _ in range(self.dataSetNum)]
+        self.dataVer = [ver+1 for ver in self.dataVer]
+        self.binNum = self.recNum
+
+#--PanelChart------------------------------------------------------------------
+    def setData(self, idx, data):
+        """ Set the data list of the data set <idx> and mark it changed, the 
+            data list should not be modified after set.
+        """
+        self.dataD[idx] = data
+        self.dataVer[idx] += 1
+        self.binNum = max(len(data) for data in self.dataD)
+
+#--PanelChart------------------------------------------------------------------
+    def _getSplinePtList(self, idx, shift):
+        """ Return the cached spline points list of the data set <idx>, the list
+            is only rebuilt when the data, display mode or scale changed.
+        """
+        key = (self.dataVer[idx], shift, self.displayMode, self.percentileScale,
+               self.appSize, self.maxCount, self.binNum)
+        cache = self.ptCache.get(idx)
+        if cache is None or cache[0] != key:
+            cache = self.ptCache[idx] = (key, self._buildSplinePtList(self.dataD[idx], shift))
+        return cache[1]
+
+#--PanelChart------------------------------------------------------------------
+    def _getMaxCount(self):
+        """ Return the max count of all the data sets (cached until the data
+            changed).
+        """
+        if self.maxCountCache[0] != self.dataVer:
+            self.maxCountCache = (list(self.dataVer), max([max(i) for i in self.dataD]))
+        return self.maxCountCache[1]
 
 #--PanelChart------------------------------------------------------------------ 
     def _drawBG(self, dc):
@@ -97,7 +168,9 @@ class PanelChart(wx.Panel):
         for i in range(len(self.times)):
             dc.DrawLine(i*pixelU, -5, i*pixelU, deltY*10)  # X-Grid
             if i % 5 == 0: 
-                dc.DrawText(str(self.times[i]+self.shiftOffset).zfill(2), i*pixelU-5, -5)
+                label = (self.times[i]+self.shiftOffset)*self.binWidth*self._getBinScale()/1000.0
+                label = str(int(label)).zfill(2) if label == int(label) else '%g' % label
+                dc.DrawText(label, i*pixelU-5, -5)
 
 #--PanelChart--------------------------------------------------------------------
     def _drawFG(self, dc):
@@ -113,54 +186,83 @@ class PanelChart(wx.Panel):
             dc.DrawRectangle(120+idx*200, y, 20, 6)
         gdc = wx.GCDC(dc) if gv.iLineStyle == 3 else None # can only have one gdc.
         # Draw the charts.
-        for idx, data in enumerate(self.dataD):
+        for idx in range(len(self.dataD)):
             color = colorSet[idx] if self.dataSetNum != 1 else colorSet[-1]
             dc.SetPen(wx.Pen(color, width=gv.iLineStyle, style=wx.PENSTYLE_SOLID))
             # Draw the line sample.
             if self.dataSetNum != 1 and idx < self.dataSetNum -1:
                 if gv.iLineStyle != 3:
-                    dc.DrawSpline(self._buildSplinePtList(data, idx)) # slightly shift idx.
+                    dc.DrawSpline(self._getSplinePtList(idx, idx)) # slightly shift idx.
                 else:
                     (r, g, b),  alph = color, 128 # half transparent alph
                     gdc.SetBrush(wx.Brush(wx.Colour(r, g, b, alph)))
-                    gdc.DrawPolygon(self._buildSplinePtList(data, idx))
+                    gdc.DrawPolygon(self._getSplinePtList(idx, idx))
             elif self.compareOverlay or self.dataSetNum == 1:
                 dc.SetPen(wx.Pen(wx.Colour((210, 210, 210)),
                                  width=2, style=wx.PENSTYLE_SOLID))
                 if gdc is None: gdc = wx.GCDC(dc)
                 r, g, b, alph = 120, 120, 120, 128  # half transparent alph
                 gdc.SetBrush(wx.Brush(wx.Colour(r, g, b, alph)))
-                gdc.DrawPolygon(self._buildSplinePtList(data, 0)) # not slightly shift.
+                gdc.DrawPolygon(self._getSplinePtList(idx, 0)) # not slightly shift.
 
 #--PanelChart------------------------------------------------------------------  
-    def _scaleCvrt(self, n):
-        """ Convert the data from liner scale Y-axis to Logarithmic scale Y-axis."""
+    def _scaleCvrt(self, data):
+        """ Convert the data array from liner scale Y-axis to Logarithmic scale 
+            Y-axis pixel array.
+        """
         deltY = (self.appSize[1]-90)//10
-        for idx, val in enumerate(self.logScale):
-            if n <= val:
-                # Get the previous scale.
-                preVal = 0 if idx == 0 else self.logScale[idx-1]
-                # Compare with the pervious scale calculate the delta-pixel distance.
-                return int((n-preVal)/float((val-preVal))*deltY+deltY*(idx))
-        return deltY*10  # return the max
+        scale = np.asarray(self.logScale, dtype=np.int64)
+        # Index of the first scale >= n, len(scale) if n is bigger than the max.
+        idx = np.searchsorted(scale, data, side='left')
+        inRange, idx = idx < len(scale), np.minimum(idx, len(scale)-1)
+        # Get the previous scale.
+        preVal, val = np.concatenate(([0], scale))[idx], scale[idx]
+        # Compare with the pervious scale calculate the delta-pixel distance.
+        ptY = ((data-preVal)/(val-preVal)*deltY+deltY*idx).astype(np.int64)
+        return np.where(inRange, ptY, deltY*10)  # the max if out of scale.
+
+#--PanelChart------------------------------------------------------------------ 
+    def _setAxis(self, dc):
+        """ Set the dc axis orientation area and fmt to up + right direction."""
+        dc.SetDeviceOrigin(40, self.appSize[1]-40)
+        dc.SetAxisOrientation(True, True)
+        dc.SetFont(self.textFont)
+
+#--PanelChart------------------------------------------------------------------ 
+    def _getBGBitmap(self):
+        """ Return the chart background bitmap, the background is only redrawn
+            when the panel size, font, display mode, x-axis shift/scale or the 
+            linear dynamic Y-axis max count changed.
+        """
+        w, h = self.GetClientSize()
+        key = ((w, h), self.textFont.GetNativeFontInfoDesc(), self.displayMode, 
+               self.shiftOffset, self.percentileScale, self.binWidth, self.maxCount,
+               self.binNum)
+        if self.bgBitmap is None or key != self.bgKey:
+            self.bgBitmap = wx.Bitmap(max(w, 1), max(h, 1))
+            mdc = wx.MemoryDC(self.bgBitmap)
+            mdc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+            mdc.Clear()
+            self._setAxis(mdc)
+            self._drawBG(mdc)
+            mdc.SelectObject(wx.NullBitmap)
+            self.bgKey = key
+        return self.bgBitmap
 
 #--PanelChart------------------------------------------------------------------ 
     def onPaint(self, event):
         """ Main panel drawing function."""
         dc = wx.PaintDC(self)
-        # set the axis orientation area and fmt to up + right direction.
-        dc.SetDeviceOrigin(40, self.appSize[1]-40)
-        dc.SetAxisOrientation(True, True)
         # set the text font
         if self.textFont is None:
             self.textFont  = dc.GetFont()
             self.textFont.SetPointSize(8)
-        dc.SetFont(self.textFont)
         # Calculate the Y-up max limit value if under linear dynamic mode.
-        self.maxCount = max([max(i) for i in self.dataD]) if self.displayMode == 1 else 0
-        # draw the background 
-        self._drawBG(dc)
+        self.maxCount = self._getMaxCount() if self.displayMode == 1 else 0
+        # blit the cached background (device coordinates) 
+        dc.DrawBitmap(self._getBGBitmap(), 0, 0)
         # draw the distribution chart.
+        self._setAxis(dc)
         self._drawFG(dc)
 
 #--PanelChart------------------------------------------------------------------ 
@@ -170,10 +272,13 @@ class PanelChart(wx.Panel):
 
 #--PanelChart------------------------------------------------------------------  
     def setLabel(self, labelList):
-        """ Set the chart color label. <labelList>: the list of the CSV file's path."""
+        """ Set the chart color label. <labelList>: the list of the CSV file's path
+            (or the live data's URL, which is shown as it is).
+        """
         splitChr = '\\' if gv.WINP else '/'
-        for i in range(len(labelList)):
-            self.labelInfo[i] = str(labelList[i].split(splitChr)[-1])[:-3]
+        for i in range(min(len(labelList), len(self.labelInfo))):
+            name = str(labelList[i])
+            self.labelInfo[i] = name if '://' in name else name.split(splitChr)[-1][:-3]
 
 #--PanelChart------------------------------------------------------------------ 
     def updateDisplay(self, updateFlag=None):
@@ -256,13 +361,8 @@ class PanelSetting(wx.Panel):
     def onStartExp(self, event):
         """ Start the experiment."""
         csvFtag = 'M'if self.mode == 0 else 'D'
+        # the data manager updates the display panel when the data is ready.
         gv.iDataMgr.setPanelData(csvFtag)
-        # Force update the display panel.
-        if self.mode == 0 and gv.iChartPanel0:
-            pass
-            #gv.iChartPanel0.updateDisplay()
-        elif gv.iChartPanel1:
-            gv.iChartPanel1.updateDisplay()
         gv.iMainFame.infoWinClose(None)
 
 #--PanelSetting----------------------------------------------------------------
@@ -277,17 +377,37 @@ class PanelSetting(wx.Panel):
                     data[2]+':'+data[3]+' '+data[4]+' '+data[5]+'\n'
                 fh.write(line)
                 fh.write('sleep1\n\n')
+        csvFtag = 'M'if self.mode == 0 else 'D'
+        if gv.iExpRunFlag:
+            # the experiments are run in the background, the process bar is 
+            # increased by the experiment events.
+            expNum = gv.iDataMgr.requestExperiment(csvFtag, gv.CONFIG_FILE[self.mode])
+            if expNum < 0: return # the last experiments are still running.
+            self.processDisplay.SetRange(max(1, expNum))
+            self.processDisplay.SetValue(0)
+            self.fetchBt.SetLabel("Running")
+            return
         # Show the process bar increase. 
         waitT = 0.2 if self.mode == 0 else 0.1
         for i in range(1,11):
             self.processDisplay.SetValue(i)
             time.sleep(waitT)
         # Load CSV tag
-        csvFtag = 'M'if self.mode == 0 else 'D'
-        gv.iDataMgr.loadCSVData(csvFtag)
+        gv.iDataMgr.requestLoad(csvFtag)
         self.fetchBt.SetLabel("Finished")    
         self.fetchBt.Enable(True)
 
+#--PanelSetting----------------------------------------------------------------
+    def setExpState(self, event, expName, info):
+        """ Update the process bar by the experiment event."""
+        if event in ('done', 'fail', 'timeout', 'cancel'):
+            self.processDisplay.SetValue(min(self.processDisplay.GetRange(), 
+                                             self.processDisplay.GetValue()+1))
+        elif event == 'finish':
+            self.processDisplay.SetValue(self.processDisplay.GetRange())
+            self.fetchBt.SetLabel("Finished")
+            self.fetchBt.Enable(True)
+
 #--PanelSetting----------------------------------------------------------------
     def setCellVals(self):
         """ Load the default value to the cells. """
@@ -394,13 +514,12 @@ class PanelCPResult(wx.Panel):
             idxF = len(gv.iChartPanel1.dataD[0]) - self.sampleNum
         gv.iChartPanel3.compareOverlay = True
         gv.iChartPanel3.shiftOffset = idxF//10
-        gv.iChartPanel3.dataD[2] = gv.iChartPanel0.dataD[2][idxF:idxF+self.sampleNum]
-        gv.iChartPanel3.dataD[-1] = gv.iChartPanel1.dataD[0][idxF:idxF+self.sampleNum]
+        modelData = gv.iChartPanel0.dataD[2][idxF:idxF+self.sampleNum]
+        dataData = gv.iChartPanel1.dataD[0][idxF:idxF+self.sampleNum]
         # make the end value to be 0
-        gv.iChartPanel3.dataD[2][0] = 0
-        gv.iChartPanel3.dataD[-1][0] = 0
-        gv.iChartPanel3.dataD[2][-1] = 0
-        gv.iChartPanel3.dataD[-1][-1] = 0
+        modelData[0] = dataData[0] = modelData[-1] = dataData[-1] = 0
+        gv.iChartPanel3.setData(2, modelData)
+        gv.iChartPanel3.setData(-1, dataData)
         gv.iChartPanel3.updateDisplay()
 
 #--PanelCPResult---------------------------------------------------------------
@@ -418,4 +537,4 @@ class PanelCPResult(wx.Panel):
     def startMatch(self, event):
         """ Set the data match flag. """
         gv.iDataMgr.matchFlag = 0
-        self.processDisplay.SetValue(gv.iDataMgr.matchFlag+1)
+        self.processDisplay.SetValue(1)
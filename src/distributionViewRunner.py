@@ -0,0 +1,271 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        distributionViewRunner.py
+#
+# Purpose:     This module is used to run the NetFetcher experiment script
+#              (the *.bat file created by the experiment setup panel) without
+#              blocking: the "Run:" lines are run by the verifier program at
+#              the same time in an asyncio event loop, with a concurrency limit
+#              per target (ip:port), a run timeout and the cancellation. The
+#              experiment state changes are reported by the event call back,
+#              so the data manager loads the result file when it is ready. If
+#              the rows call back is set, the verifier's stdout CSV rows are 
+#              streamed to it in batches while the experiment runs and are 
+#              also written to a file, which is archived only if the verifier
+#              did not write its result file.
+#
+#              Script format:
+#              Run: <ip>:<port> <file ID>:<block num> <iterations> <output file>
+#              sleep<N> / Sleep <N> : later runs start N seconds later.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import os
+import re
+import shutil
+import time
+import asyncio
+import threading
+
+VERIFIER_CMD = './verifier'     # experiment run program.
+INTERM_RES = 'exp-output.csv'   # result file the verifier writes in its work dir.
+EXP_DIR = 'ExpRes'              # experiment result folder.
+LABEL_FILE = 'exps.exp'         # experiment labels file in the result folder.
+STREAM_RES = 'exp-stream.csv'  # stdout rows file written in the work dir.
+RUN_EXT = '.run'                # ext of the per experiment work dir.
+STREAM_BATCH = 1000 # max stdout rows streamed in one batch.
+STREAM_PERIOD = 0.5 # max time(sec) the stdout rows are kept before streamed.
+# Experiment events reported by the call back onEvent(event, expName, info).
+EXP_EVENTS = ('start', 'done', 'fail', 'timeout', 'cancel', 'finish')
+
+#-----------------------------------------------------------------------------
+def extractLabels(line):
+    """ Build the experiment label text of the script "Run:" line."""
+    label = '#!' + line.split()[-1] + '\n'
+    exp = ''
+    if '127.0.0.1' in line:
+        exp += 'Local Fetch\n'
+    elif '172.' in line:
+        exp += 'Remote (LAN) Fetch\n'
+    match = re.search('ile(.*) ', line)
+    fsize_bsize = match.group(1).split(':') if match else ['0', '0']
+    if 'file' in line:
+        # the file ID is not a size exponent in the setup panel's script.
+        exp += ('File Size: ' + str(pow(2, int(fsize_bsize[0]))) if fsize_bsize[0].isdigit()
+                else 'File ID: ' + line.split()[2].split(':')[0]) + '\n'
+        exp += 'Block Size: ' + fsize_bsize[1].split()[0] + '\n'
+        exp += 'Iterations: ' + line.split()[-2] + '\n'
+    elif 'bigFile' in line:
+        exp += 'File Size: 1 MB\nBlock Size: ' + fsize_bsize[1].split()[0] + '\n'
+    elif 'biggerFile' in line:
+        exp += 'File Size: 1 GB\nBlock Size: ' + fsize_bsize[1].split()[0] + '\n'
+    elif 'biggestFile' in line:
+        exp += 'File Size: 4.1 GB\nBlock Size: ' + fsize_bsize[1].split()[0] + '\n'
+    if '-f' in line:
+        exp += 'Flood (No Sleep)\n'
+    elif '-r' in line:
+        exp += 'Random Sleep\n'
+    return label + exp
+
+#-----------------------------------------------------------------------------
+def parseScript(scriptPath):
+    """ Parse the experiment script, return the list of experiment dicts:
+        {'name': output file, 'target': ip:port, 'args': verifier arguments,
+        'delay': start delay(sec), 'line': script line}. The delay is the sum
+        of the sleep lines before the experiment.
+    """
+    exps, delay = [], 0
+    with open(scriptPath) as fh:
+        for line in fh:
+            words = line.split()
+            if not words or line[:3] == 'rem': continue
+            sleep = re.match(r'sleep\s*(\d+)$', ' '.join(words), re.IGNORECASE)
+            if sleep:
+                delay += int(sleep.group(1))
+            elif words[0] == 'Run:' and len(words) > 2:
+                exps.append({'name': words[-1], 'target': words[1], 'args': ' '.join(words[1:-1]),
+                             'delay': delay, 'line': line})
+    return exps
+
+#-----------------------------------------------------------------------------
+def expFileName(expDir, expName):
+    """ Return the result file path of the experiment in the result folder."""
+    return os.path.join(expDir, expName if expName.endswith('.csv') else expName + '.csv')
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class expRunner(object):
+    """ Run the experiment script's experiments at the same time in an asyncio
+        event loop. Every experiment is run in its own work dir (the verifier
+        always writes the INTERM_RES in its work dir), the result file is moved
+        to the result folder as <output file> when the run is done.
+        If the rows call back onRows(expName, lines) is set, the verifier's 
+        stdout is read line by line: the CSV header and rows are streamed to 
+        the call back in batches (the other lines are printed) and written to
+        the STREAM_RES, which is archived if the INTERM_RES is not written.
+    """
+    def __init__(self, command=VERIFIER_CMD, expDir=EXP_DIR, targetLimit=1,
+                 timeout=None, onEvent=None, onRows=None):
+        # the work dir is changed for each run, use the program's abs path.
+        self.command = os.path.abspath(command) if os.path.isfile(command) else command
+        self.expDir = expDir
+        self.targetLimit = max(1, targetLimit)  # max runs at the same time per target.
+        self.timeout = timeout or None          # run timeout(sec), None - no timeout.
+        self.onEvent = onEvent  # call back onEvent(event, expName, info).
+        self.onRows = onRows    # call back onRows(expName, CSV lines(bytes)).
+        self.loop = None        # event loop of the running script.
+        self.tasks = []         # running experiment tasks.
+
+#--expRunner-------------------------------------------------------------------
+    def _report(self, event, expName, info=None):
+        """ Report the experiment event by the call back."""
+        print("Experiment %s : %s %s" % (expName, event, '' if info is None else str(info)))
+        if self.onEvent: self.onEvent(event, expName, info)
+
+#--expRunner-------------------------------------------------------------------
+    async def runExp(self, exp, semaphore):
+        """ Run one experiment after its start delay, return the result file
+            path or None if the run did not produce any results.
+        """
+        await asyncio.sleep(exp['delay'])
+        async with semaphore:
+            runDir = os.path.join(self.expDir, exp['name'] + RUN_EXT)
+            os.makedirs(runDir, exist_ok=True)
+            self._report('start', exp['name'], exp['args'])
+            # no shell between, so the timeout/cancel kills the verifier itself.
+            proc = await asyncio.create_subprocess_exec(
+                self.command, *exp['args'].split(), cwd=runDir,
+                stdout=asyncio.subprocess.PIPE if self.onRows else None,
+                stderr=asyncio.subprocess.STDOUT)
+            try:
+                await asyncio.wait_for(self._waitProc(proc, exp['name'], runDir), self.timeout)
+            except asyncio.TimeoutError:
+                self._report('timeout', exp['name'], self.timeout)
+                return None
+            except asyncio.CancelledError:
+                self._report('cancel', exp['name'])
+                raise
+            finally:
+                if proc.returncode is None:
+                    proc.kill()
+                    await asyncio.shield(proc.wait())
+                    shutil.rmtree(runDir, ignore_errors=True)
+            return self._collectResult(exp, runDir, proc.returncode)
+
+#--expRunner-------------------------------------------------------------------
+    async def _waitProc(self, proc, expName, runDir):
+        """ Stream the verifier's stdout rows if it is piped, then wait for the
+            verifier to exit.
+        """
+        if proc.stdout is not None:
+            await self._streamRows(proc.stdout, expName, os.path.join(runDir, STREAM_RES))
+        return await proc.wait()
+
+#--expRunner-------------------------------------------------------------------
+    async def _streamRows(self, stdout, expName, streamFile):
+        """ Read the stdout line by line, write the CSV header (the first 'exp'
+            line) and the rows to the stream file and call the rows call back
+            every STREAM_BATCH rows or STREAM_PERIOD seconds.
+        """
+        lines, lastT, started = [], time.monotonic(), False
+        with open(streamFile, 'wb') as fh:
+            while True:
+                line = await stdout.readline()
+                if line and (line[:1].isdigit() or (not started and line.startswith(b'exp'))):
+                    lines.append(line if line.endswith(b'\n') else line + b'\n')
+                    started = True
+                elif line:
+                    print(line.decode(errors='replace').rstrip())
+                if lines and (not line or len(lines) >= STREAM_BATCH or 
+                              time.monotonic() - lastT >= STREAM_PERIOD):
+                    fh.write(b''.join(lines))
+                    fh.flush()
+                    self.onRows(expName, lines)
+                    lines, lastT = [], time.monotonic()
+                if not line: break
+
+#--expRunner-------------------------------------------------------------------
+    def _collectResult(self, exp, runDir, returnCode):
+        """ Move the experiment result file from its work dir to the result
+            folder, return the result file path or None if it is not found.
+            The verifier's result file is always used if it is written, the
+            streamed rows file is only used if not (and it has rows).
+        """
+        resFile = os.path.join(runDir, INTERM_RES)
+        streamFile = os.path.join(runDir, STREAM_RES)
+        if not os.path.isfile(resFile) and os.path.isfile(streamFile) and os.path.getsize(streamFile):
+            resFile = streamFile
+        expFile = expFileName(self.expDir, exp['name'])
+        if not os.path.isfile(resFile):
+            shutil.rmtree(runDir, ignore_errors=True)
+            self._report('fail', exp['name'], "%s not found, return code %s" % (INTERM_RES, str(returnCode)))
+            return None
+        os.replace(resFile, expFile)
+        shutil.rmtree(runDir, ignore_errors=True)
+        self._report('done', exp['name'], expFile)
+        return expFile
+
+#--expRunner-------------------------------------------------------------------
+    async def runScript(self, scriptPath):
+        """ Run all the experiments in the script, return the list of result
+            file paths (None for the experiment without results). The labels
+            of the experiments with results are written to the LABEL_FILE.
+        """
+        os.makedirs(self.expDir, exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        exps = parseScript(scriptPath)
+        semaphores = dict((exp['target'], asyncio.Semaphore(self.targetLimit)) for exp in exps)
+        self.tasks = [asyncio.ensure_future(self.runExp(exp, semaphores[exp['target']])) for exp in exps]
+        try:
+            results = await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            self.tasks = []
+        expFiles = [None if isinstance(result, BaseException) else result for result in results]
+        for exp, result in zip(exps, results):
+            if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError):
+                self._report('fail', exp['name'], str(result))
+        if any(expFiles):
+            shutil.copyfile(scriptPath, os.path.join(self.expDir, os.path.basename(scriptPath)))
+            with open(os.path.join(self.expDir, LABEL_FILE), 'w') as op:
+                op.writelines(extractLabels(exp['line']) for exp, expFile in zip(exps, expFiles) if expFile)
+        self._report('finish', os.path.basename(scriptPath), sum(1 for expFile in expFiles if expFile))
+        return expFiles
+
+#--expRunner-------------------------------------------------------------------
+    def cancel(self):
+        """ Cancel the running experiments (can be called from any thread), the
+            verifier processes are killed.
+        """
+        if self.loop is None or self.loop.is_closed(): return
+        for task in list(self.tasks):
+            self.loop.call_soon_threadsafe(task.cancel)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class expRunnerThread(threading.Thread):
+    """ Thread to run the experiment script's event loop, so the caller (the wx
+        main thread) is not blocked. The events are reported from this thread.
+    """
+    def __init__(self, scriptPath, runner):
+        threading.Thread.__init__(self, name='expRunner', daemon=True)
+        self.scriptPath = scriptPath
+        self.runner = runner
+        self.expFiles = []
+
+    def run(self):
+        try:
+            self.expFiles = asyncio.run(self.runner.runScript(self.scriptPath))
+        except Exception as err:
+            print("Experiment script %s error: %s" % (self.scriptPath, str(err)))
+            if self.runner.onEvent:
+                self.runner.onEvent('finish', os.path.basename(self.scriptPath), 0)
+
+    def stop(self):
+        """ Cancel the running experiments."""
+        self.runner.cancel()
@@ -15,21 +15,28 @@
 # License:     MIT License
 #-----------------------------------------------------------------------------
 
-import csv
+import os
 import time
-import glob
+import queue
+import threading
+from concurrent.futures.process import BrokenProcessPool
 import wx # use wx to build the UI.
-import random
-import numpy as np
 # Import the local modules
 import distributionViewGlobal as gv
 import distributionViewPanel as dvp
-#import distributionVieweBCRun as btcRun
+import distributionViewData as dvd
+import distributionViewMatch as dvm
+import distributionViewCore as dvc
+import distributionViewRunner as dvr
+import distributionViewListener as dvl
 
 UPDATE_U = 1        # update time unit for test.
 PERIODIC = 500      # update in every 500ms
-SAMPLE_COUNT = 760  # max number of sample displayed in Y-Axis.
+SAMPLE_COUNT = dvc.SAMPLE_COUNT # max number of sample displayed in Y-Axis.
+JOB_TAGS = ('M', 'D', 'C', 'P', 'S') # data manager background job tags.
 DEF_SIZE = (1920, 680) if gv.iCPMode else (1920, 1040) 
+WINDOW_SECS = (10, 60, 300, 600)   # time window(sec) choices of the display view.
+BIN_NUMS = (380, 760, 1520, 3040)   # histogram bin number choices of the display view.
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -45,7 +52,6 @@ class distributionViewFrame(wx.Frame):
         gv.iMainFame = self
         self.sampleCount = SAMPLE_COUNT
         self.infoWindow = None  # popup window to do the setting.
-        self.updateLock = True  # lock flag of main program update.
         self.synAdjust = True   # synchronize adjustment on 2 display panels.
         self.displayChoice = \
             ('Type 0: Timestamping Difference',
@@ -61,13 +67,12 @@ class distributionViewFrame(wx.Frame):
         fileItem = fileMenu.Append(wx.ID_HELP, 'Help', 'Help Information')
         self.Bind(wx.EVT_MENU, self.onHelp, fileItem)
         self.SetMenuBar(menubar)
+        self.statusBar = self.CreateStatusBar() # show the data loading progress.
         #self.SetSizer(self.buildUISizerC())
         uiSizer = self.buildUISizerCpmode() if gv.iCPMode else self.buildUISizerNlmode()
         self.SetSizer(uiSizer)
         # The csv data manager.
         gv.iDataMgr = self.dataMgr = distributionDataMgr(self)
-        # Init the thread to call experiment program.
-        # self.expThread = btcRun.commThread(1, "Thread-1", 1)
         # Init the periodic timer.
         self.lastPeriodicTime = time.time()
         self.timer = wx.Timer(self)
@@ -110,6 +115,19 @@ class distributionViewFrame(wx.Frame):
         self.disModeMCB.Bind(wx.EVT_COMBOBOX, self.onChangeYS)
         hbox0.Add(self.disModeMCB, flag=flagsR, border=2)
         hbox0.AddSpacer(10)
+        widthChoice = ['Bin Width: %s' % (str(w)+' us' if w < 1000 else str(w//1000)+' ms')
+                       for w in dvd.PYRAMID_WIDTHS]
+        numChoice = ['Bin Number: %d' % num for num in BIN_NUMS]
+        self.binWidthMCB = wx.ComboBox(self, -1, choices=widthChoice, style=wx.CB_READONLY)
+        self.binWidthMCB.SetSelection(dvd.PYRAMID_WIDTHS.index(dvd.BIN_WIDTH))
+        self.binWidthMCB.Bind(wx.EVT_COMBOBOX, self.onChangeBV)
+        hbox0.Add(self.binWidthMCB, flag=flagsR, border=2)
+        hbox0.AddSpacer(10)
+        self.binNumMCB = wx.ComboBox(self, -1, choices=numChoice, style=wx.CB_READONLY)
+        self.binNumMCB.SetSelection(BIN_NUMS.index(SAMPLE_COUNT))
+        self.binNumMCB.Bind(wx.EVT_COMBOBOX, self.onChangeBV)
+        hbox0.Add(self.binNumMCB, flag=flagsR, border=2)
+        hbox0.AddSpacer(10)
         self.cpAdjustCB = wx.CheckBox(modelPanel, label = 'Compare mode') 
         self.cpAdjustCB.SetValue(False)
         self.cpAdjustCB.Bind(wx.EVT_CHECKBOX, self.onChangeCPMode)
@@ -195,6 +213,19 @@ class distributionViewFrame(wx.Frame):
         self.disModeMCB .SetSelection(0)
         self.disModeMCB.Bind(wx.EVT_COMBOBOX, self.onChangeYS)
         hbox0.Add(self.disModeMCB, flag=flagsR, border=2)
+        hbox0.AddSpacer(10)
+        widthChoice = ['Bin Width: %s' % (str(w)+' us' if w < 1000 else str(w//1000)+' ms')
+                       for w in dvd.PYRAMID_WIDTHS]
+        numChoice = ['Bin Number: %d' % num for num in BIN_NUMS]
+        self.binWidthMCB = wx.ComboBox(self, -1, choices=widthChoice, style=wx.CB_READONLY)
+        self.binWidthMCB.SetSelection(dvd.PYRAMID_WIDTHS.index(dvd.BIN_WIDTH))
+        self.binWidthMCB.Bind(wx.EVT_COMBOBOX, self.onChangeBV)
+        hbox0.Add(self.binWidthMCB, flag=flagsR, border=2)
+        hbox0.AddSpacer(10)
+        self.binNumMCB = wx.ComboBox(self, -1, choices=numChoice, style=wx.CB_READONLY)
+        self.binNumMCB.SetSelection(BIN_NUMS.index(SAMPLE_COUNT))
+        self.binNumMCB.Bind(wx.EVT_COMBOBOX, self.onChangeBV)
+        hbox0.Add(self.binNumMCB, flag=flagsR, border=2)
         sizer.Add(hbox0, flag=flagsR, border=2)
         # Row idx 1: display panel for the model.
         sizer.AddSpacer(2)
@@ -238,6 +269,18 @@ class distributionViewFrame(wx.Frame):
         self.disModeDCB.Enable(False)
         hbox1.Add(self.disModeDCB, flag=flagsR, border=2)
         hbox1.AddSpacer(10)
+        self.binWidthDCB = wx.ComboBox(self, -1, choices=widthChoice, style=wx.CB_READONLY)
+        self.binWidthDCB.SetSelection(dvd.PYRAMID_WIDTHS.index(dvd.BIN_WIDTH))
+        self.binWidthDCB.Bind(wx.EVT_COMBOBOX, self.onChangeBV)
+        self.binWidthDCB.Enable(False)
+        hbox1.Add(self.binWidthDCB, flag=flagsR, border=2)
+        hbox1.AddSpacer(10)
+        self.binNumDCB = wx.ComboBox(self, -1, choices=numChoice, style=wx.CB_READONLY)
+        self.binNumDCB.SetSelection(BIN_NUMS.index(SAMPLE_COUNT))
+        self.binNumDCB.Bind(wx.EVT_COMBOBOX, self.onChangeBV)
+        self.binNumDCB.Enable(False)
+        hbox1.Add(self.binNumDCB, flag=flagsR, border=2)
+        hbox1.AddSpacer(10)
         self.pauseBt = wx.Button(
             self, label='Reload Data', style=wx.BU_LEFT, size=(80, 23))
         self.pauseBt.Bind(wx.EVT_BUTTON, self.reloadData)
@@ -305,6 +348,16 @@ class distributionViewFrame(wx.Frame):
         self.pctCB.SetSelection(0)
         hbox2.Add(self.pctCB, flag=flagsR, border=2)
         hbox2.AddSpacer(10)
+        if gv.iWindowNum:
+            # the time window view can only be set if the files keep the buckets.
+            self.windowSecs = [0] + [sec for sec in WINDOW_SECS if sec <= gv.iWindowNum]
+            self.windowCB = wx.ComboBox(
+                self, -1, choices=['Window: %s' % ('All' if sec == 0 else 'Last %d s' % sec) 
+                                   for sec in self.windowSecs], style=wx.CB_READONLY)
+            self.windowCB.Bind(wx.EVT_COMBOBOX, self.onChangeWin)
+            self.windowCB.SetSelection(0)
+            hbox2.Add(self.windowCB, flag=flagsR, border=2)
+            hbox2.AddSpacer(10)
         self.fontSelBt = wx.Button(self, label='Font Selection', style=wx.BU_LEFT, size=(100, 23))
         self.fontSelBt.Bind(wx.EVT_BUTTON, self.onChangeFont)
         hbox2.Add(self.fontSelBt, flag=flagsR, border=2)
@@ -322,35 +375,44 @@ class distributionViewFrame(wx.Frame):
             self.infoWindow.Destroy()
             gv.iSetupPanel = None
             self.infoWindow = None
-            self.updateLock = False    # continouse all the data load process
 
 #--distributionViewFrame-------------------------------------------------------
     def periodic(self, event):
-        """ Call back every periodic time."""
-        if (not self.updateLock) and time.time() - self.lastPeriodicTime >= gv.iUpdateRate:
-            #self.dataMgr.setPanelData('M')
+        """ Call back every periodic time. The data manager's background worker
+            updates the panels when the new data snapshot is ready.
+        """
+        if time.time() - self.lastPeriodicTime >= gv.iUpdateRate:
             self.dataMgr.periodic(time.time())
-            gv.iChartPanel0.updateDisplay()
             self.lastPeriodicTime = time.time()
 
 #--distributionViewFrame-------------------------------------------------------
     def reloadData(self, event):
         """ Reload data from the data folder and update the display"""
         print("Reload data from the data folder. ")
-        self.dataMgr.loadCSVData('D')
-        gv.iChartPanel1.updateDisplay()
+        self.dataMgr.requestLoad('D')
         
+#--distributionViewFrame-------------------------------------------------------
+    def setLoadProgress(self, fileName, parsedBytes, fileBytes):
+        """ Show the csv file loading progress in the status bar."""
+        pct = 100 if fileBytes <= 0 else min(100, parsedBytes*100//fileBytes)
+        self.statusBar.SetStatusText("Loading %s : %d%%" % (fileName, pct) if pct < 100 
+                                     else "Loaded %s" % fileName)
+
+#--distributionViewFrame-------------------------------------------------------
+    def setExpState(self, event, expName, info):
+        """ Show the experiment event in the status bar and the setup panel."""
+        self.statusBar.SetStatusText("Experiment %s : %s" % (expName, event))
+        if gv.iSetupPanel: gv.iSetupPanel.setExpState(event, expName, info)
+
 #--distributionViewFrame-------------------------------------------------------
     def onChangeDCT(self, event):
         """ Change the data display check data type."""
         self.dataMgr.setTypeChIdx(self.chartTypeCH1.GetSelection(), 'D')
-        gv.iChartPanel1.updateDisplay()
 
 #--distributionViewFrame-------------------------------------------------------
     def onChangeDMT(self, event):
         """ Change the model display data type."""
         self.dataMgr.setTypeChIdx(self.chartTypeCH0.GetSelection(), 'M')
-        gv.iChartPanel0.updateDisplay()
         if self.synAdjust:
             self.chartTypeCH1.SetSelection(self.chartTypeCH0.GetSelection())
             self.onChangeDCT(None)
@@ -377,21 +439,48 @@ class distributionViewFrame(wx.Frame):
 #--distributionViewFrame-------------------------------------------------------
     def onChangePct(self, event):
         """ Change the display data percentile."""
-        setTag = self.pctCB.GetSelection()
-        self.dataMgr.getDataPercentile(setTag)
-        percentileVal = 1 if setTag == 0 else self.sampleCount*1.0/self.dataMgr.percentile
+        self.dataMgr.requestPercentile(self.pctCB.GetSelection())
+
+#--distributionViewFrame-------------------------------------------------------
+    def setPercentileScale(self, setTag, percentile):
+        """ Set the display panels' x-Axis scale based on the data percentile 
+            calculated by the data manager.
+        """
+        percentileVal = 1 if setTag == 0 or percentile <= 0 else self.sampleCount*1.0/percentile
         gv.iChartPanel0.percentileScale = gv.iChartPanel1.percentileScale = percentileVal
         gv.iChartPanel0.updateDisplay()
         gv.iChartPanel1.updateDisplay()
 
+#--distributionViewFrame-------------------------------------------------------
+    def onChangeBV(self, event):
+        """ Change the histogram bin view (bin width and bin number) of the 
+            [model]/[data] display panel, the [data] panel follows the [model]
+            panel if the synchronize adjustment is set.
+        """
+        tag = 'D' if event.GetEventObject() in (self.binWidthDCB, self.binNumDCB) else 'M'
+        if self.synAdjust:
+            self.binWidthDCB.SetSelection(self.binWidthMCB.GetSelection())
+            self.binNumDCB.SetSelection(self.binNumMCB.GetSelection())
+            tag = None
+        widthCB, numCB = (self.binWidthDCB, self.binNumDCB) if tag == 'D' else (self.binWidthMCB, self.binNumMCB)
+        binWidth = dvd.PYRAMID_WIDTHS[widthCB.GetSelection()]
+        # the compare panel shows the data panel's bins.
+        panels = {'M': (gv.iChartPanel0,), 'D': (gv.iChartPanel1, gv.iChartPanel3)}
+        for key in (('M', 'D') if tag is None else (tag,)):
+            for panel in panels[key]:
+                if panel: panel.binWidth = binWidth
+        self.dataMgr.setBinView(binWidth, binNum=BIN_NUMS[numCB.GetSelection()], tag=tag)
+        if tag != 'M': self.dataMgr.requestPercentile(self.pctCB.GetSelection())
+
+#--distributionViewFrame-------------------------------------------------------
+    def onChangeWin(self, event):
+        """ Change the time window of the display panels."""
+        self.dataMgr.setWindow(self.windowSecs[self.windowCB.GetSelection()])
+
 #--distributionViewFrame-------------------------------------------------------
     def onChangeSR(self, event):
         """ change the sample rate of each data set."""
-        self.dataMgr.sampleRate = (int(self.SampleRCH0.GetSelection())+1)*10
-        self.dataMgr.setPanelData('M')
-        self.dataMgr.setPanelData('D')
-        gv.iChartPanel0.updateDisplay()
-        gv.iChartPanel1.updateDisplay()
+        self.dataMgr.setSampleRate((int(self.SampleRCH0.GetSelection())+1)*10)
 
 #--distributionViewFrame-------------------------------------------------------
     def onChangeCPMode(self, evnet):
@@ -405,9 +494,13 @@ class distributionViewFrame(wx.Frame):
         if self.synAdjust:
             self.chartTypeCH1.Enable(False)
             self.disModeDCB.Enable(False)
+            self.binWidthDCB.Enable(False)
+            self.binNumDCB.Enable(False)
         else:
             self.chartTypeCH1.Enable(True)
             self.disModeDCB.Enable(True)
+            self.binWidthDCB.Enable(True)
+            self.binNumDCB.Enable(True)
 
 #--distributionViewFrame-------------------------------------------------------
     def onChangeUR(self, event):
@@ -439,7 +532,6 @@ class distributionViewFrame(wx.Frame):
     def onSetupModelExp(self, event):
         """ Pop-up the model experiment setup window. """
         if self.infoWindow is None and gv.iSetupPanel is None:
-            self.updateLock = True    # Lock all the data load process
             self.infoWindow = wx.MiniFrame(self, -1,
                                 'NetFetcher [Model] Experiment Setup', 
                                 pos=(300, 300), size=(620, 250),
@@ -452,7 +544,6 @@ class distributionViewFrame(wx.Frame):
     def onSetupCheckExp(self, event):
         """ Pop-up the check experiment setup window. """
         if self.infoWindow is None and gv.iSetupPanel is None:
-            self.updateLock = True    # Lock all the data load process
             self.infoWindow = wx.MiniFrame(self, -1,
                                 'NetFetcher [Check] Experiment Setup', 
                                 pos=(300, 300), size=(620, 160),
@@ -463,201 +554,436 @@ class distributionViewFrame(wx.Frame):
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
-class distributionDataMgr(object):
-    """ Manager module to process the csv files."""
+class distributionDataMgr(dvc.distributionDataCore):
+    """ Manager module to process the csv files. The data loading, sampling and
+        matching jobs are run by a background worker thread, the results are 
+        published to the panels on the wx main thread as data snapshots.
+    """
     def __init__(self, parent):
-        self.sampleRate = 30    # % of samples we will load from the [model] file.
-        self.percentile = 1     # percentile of data we are going to show.     
-        self.ModeChIdx = gv.iModelType
-        self.DataChIdx = gv.iDataType
-        self.modelD = []    # mode folder data set.
-        self.dataD = []     # data folder data set.
+        dvc.distributionDataCore.__init__(self)
+        self.parent = parent
         self.matchFlag = -1
         print("DistributionDataMgr: Loading data.")
-        self.lastPeriodicTime = time.time()
+        self.lastPollTime = {'M': time.time(), 'D': time.time()} # last folder poll time.
+        self.lastProgress = None    # last published (file name, loading percent).
+        self.pool = None        # process pool to run the file loading and data match jobs.
+        self.matchShm = None    # shared memory of the running match jobs' samples.
+        self.matchPending = 0   # number of the running match jobs.
+        self.matchLock = threading.Lock()
+        self.expThread = None   # thread running the experiment script.
+        self.listener = None    # live latency rows listener.
+        self.liveNum = 0        # rows number of the last shown listener snapshot.
+        # Background worker: job tag 'M' - model, 'D' - data, 'C' - compare 
+        # (match), 'P' - percentile, 'S' - experiment/listener stream. A job 
+        # is skipped/dropped if its tag's generation is increased (cancelled) 
+        # after it is submitted.
+        self.jobGen = dict((tag, 0) for tag in JOB_TAGS)
+        self.jobCount = dict((tag, 0) for tag in JOB_TAGS)
+        self.jobLock = threading.Lock()
+        self.jobQueue = queue.Queue()
+        self.worker = threading.Thread(target=self._workLoop, name='dataMgrWorker', daemon=True)
+        self.worker.start()
+        if gv.iListenPort: self.startListener(gv.iListenHost, gv.iListenPort)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _workLoop(self):
+        """ Background worker main loop, run the submitted jobs one by one."""
+        while True:
+            tag, gen, func, args = self.jobQueue.get()
+            try:
+                if not self.isCancelled(tag, gen): func(tag, gen, *args)
+            except BrokenProcessPool as err:
+                # a worker process died (such as out of memory), the pool can
+                # not run any job, so it is rebuilt for the next job.
+                print("DistributionDataMgr: job %s process pool error: %s" %(func.__name__, str(err)))
+                self._resetPool()
+            except Exception as err:
+                print("DistributionDataMgr: job %s error: %s" %(func.__name__, str(err)))
+            finally:
+                with self.jobLock:
+                    self.jobCount[tag] -= 1
+
+#--distributionDataMgr---------------------------------------------------------
+    def submitJob(self, tag, func, *args):
+        """ Submit a job to the background worker, the job is called as 
+            func(tag, gen, *args).
+        """
+        with self.jobLock:
+            self.jobCount[tag] += 1
+            gen = self.jobGen[tag]
+        self.jobQueue.put((tag, gen, func, args))
+
+#--distributionDataMgr---------------------------------------------------------
+    def cancelJobs(self, *tags):
+        """ Cancel the submitted/running jobs of the tags."""
+        with self.jobLock:
+            for tag in tags: self.jobGen[tag] += 1
+
+#--distributionDataMgr---------------------------------------------------------
+    def isCancelled(self, tag, gen):
+        """ Check whether the job of generation <gen> is cancelled."""
+        return gen != self.jobGen[tag]
+
+#--distributionDataMgr---------------------------------------------------------
+    def isBusy(self, tag):
+        """ Check whether there is job of the tag waiting or running."""
+        return self.jobCount[tag] > 0
     
 #--distributionDataMgr---------------------------------------------------------
-    def getDataPercentile(self, setTag):
-        """ Calculate the data pervertile value base on the input tag:
-            0 - 100%, 1 - 99.9%
+    def requestPercentile(self, setTag):
+        """ Calculate the data percentile in the background worker and set the 
+            display panels' scale when it is done.
+        """
+        self.cancelJobs('P')
+        self.submitJob('P', self._percentileJob, setTag)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _percentileJob(self, tag, gen, setTag):
+        """ Worker job: calculate the data percentile."""
+        self.getDataPercentile(setTag)
+        if not self.isCancelled(tag, gen):
+            wx.CallAfter(self.parent.setPercentileScale, setTag, self.percentile)
+
+#--distributionDataMgr---------------------------------------------------------
+    def requestLoad(self, tag):
+        """ Load the [model]/[data] folder csv files in the background worker 
+            and update the display panel when it is done.
+        """
+        self.submitJob(tag, self._loadJob)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _loadJob(self, tag, gen, sampleFlag=True):
+        """ Worker job: load the csv files and publish the panel data. The load
+            is not cancelled, only the publish of a cancelled job is skipped.
+        """
+        if self.loadCSVData(tag, progress=self._reportProgress, pool=self._getPool()) or sampleFlag: 
+            self._sampleJob(tag, gen)
+
+#--distributionDataMgr---------------------------------------------------------
+    def requestExperiment(self, tag, scriptPath):
+        """ Run the experiment script's experiments at the same time by the 
+            verifier program, the result files are saved in the [model]/[data]
+            folder and each one is loaded when its experiment is done. If the 
+            gv.iExpStream is set, the verifier's output rows are added to the
+            display while the experiment runs. Return the experiments number,
+            -1 if the last script is still running.
         """
-        self.percentile = 1 if setTag == 0 else np.percentile(self.dataD, 99.9)//1000
+        if self.expThread and self.expThread.is_alive(): return -1
+        expDir = os.path.dirname(gv.MODE_F_PATH if tag == 'M' else gv.DATA_F_PATH)
+        onRows = (lambda expName, lines: self.submitJob(
+            'S', self._streamJob, tag, dvr.expFileName(expDir, expName), lines)) if gv.iExpStream else None
+        runner = dvr.expRunner(command=gv.VERIFIER_CMD, expDir=expDir,
+                               targetLimit=gv.iExpLimit, timeout=gv.iExpTimeout,
+                               onEvent=lambda event, expName, info: self._onExpEvent(tag, event, expName, info),
+                               onRows=onRows)
+        self.expThread = dvr.expRunnerThread(scriptPath, runner)
+        self.expThread.start()
+        return len(dvr.parseScript(scriptPath))
 
 #--distributionDataMgr---------------------------------------------------------
-    def loadCSVData(self, tag):
-        """ Check all the csv file from the load the data. tag = 'M' : model folder
-            tag ='D': data folder
+    def cancelExperiment(self):
+        """ Cancel the running experiments."""
+        if self.expThread: self.expThread.stop()
+
+#--distributionDataMgr---------------------------------------------------------
+    def _onExpEvent(self, tag, event, expName, info):
+        """ Experiment event call back (called in the experiment thread), close
+            the live file and load the result file when the experiment is ended 
+            and publish the event.
+        """
+        if event in ('done', 'fail', 'timeout', 'cancel'):
+            expDir = os.path.dirname(gv.MODE_F_PATH if tag == 'M' else gv.DATA_F_PATH)
+            self.submitJob('S', self._closeLiveJob, tag, dvr.expFileName(expDir, expName))
+        wx.CallAfter(self.parent.setExpState, event, expName, info)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _streamJob(self, jobTag, gen, tag, fileName, lines):
+        """ Worker job: append the streamed experiment rows to the live file and
+            update its panel slot (all the slots if the file is added).
+        """
+        self._publishLiveFile(tag, *self.appendLiveRows(tag, fileName, lines))
+
+#--distributionDataMgr---------------------------------------------------------
+    def _publishLiveFile(self, tag, idx, added):
+        """ Update the live file's panel slot (all the slots if the file is 
+            added, as the slots are shifted).
         """
-        if not tag:
-            print("The input type tag must be defined!")
+        gen = self.jobGen[tag]
+        if added:
+            self._sampleJob(tag, gen)
             return
-        filePaths, rowTypeIdx = None, 0
-        if tag == 'M':
-            filePaths = glob.glob(gv.MODE_F_PATH)
-            self.modelD = []
-            gv.iChartPanel0.setLabel(filePaths)
-            gv.iChartPanel3.setLabel(filePaths)
-            rowTypeIdx = self.ModeChIdx
-        else:
-            filePaths = glob.glob(gv.DATA_F_PATH)
-            self.dataD = []
-            gv.iChartPanel1.setLabel(filePaths)
-            rowTypeIdx = self.DataChIdx
-        for fileName in filePaths:
-            dataSet = []
-            with open(fileName) as f:
-                f_csv = csv.reader(f)
-                _ = next(f_csv)  # skip the csv header.
-                for row in f_csv:
-                    i = int(
-                        row[rowTypeIdx+1]) if rowTypeIdx < 5 else (int(row[3])+int(row[4]))
-                    dataSet.append(i)
-            _ = self.modelD.append(dataSet) if tag == 'M'else self.dataD.append(dataSet)
+        filePaths, dataList = self.buildPanelData(tag, fileIdxs=[idx])
+        wx.CallAfter(self._publishPanelSlots, tag, gen, filePaths, {idx: dataList[0]})
 
 #--distributionDataMgr---------------------------------------------------------
-    def setPanelData(self, tag):
-        """ Set the data manager's data based on the smaple rate to panel for display. 
-            tag = 'M' : model csv, tag ='D': data csv
+    def startListener(self, host, port):
+        """ Start the UDP/TCP listener to collect the latency rows sent by the
+            probes, the received data is shown as the first data set (slot 0)
+            of the [data] display panel, ahead of the data folder files.
         """
+        try:
+            self.listener = dvl.latencyListener(host, port, windowNum=self.windowNum)
+        except OSError as err:
+            print("DistributionDataMgr: listen on %s:%s error: %s" % (host, str(port), str(err)))
+            return
+        self.listener.start()
+
+#--distributionDataMgr---------------------------------------------------------
+    def _liveJob(self, jobTag, gen):
+        """ Worker job: show the listener's last data snapshot, the snapshot is
+            taken by reference, the listener thread is not blocked.
+        """
+        snapshot = self.listener.snapshot
+        if snapshot is None or snapshot.rowNum == self.liveNum: return
+        self.liveNum = snapshot.rowNum
+        self._publishLiveFile('D', *self.setLiveFile('D', snapshot))
+
+#--distributionDataMgr---------------------------------------------------------
+    def _closeLiveJob(self, jobTag, gen, tag, fileName):
+        """ Worker job: close the experiment's live file and load the folder, 
+            the streamed rows are not parsed again.
+        """
+        self.closeLiveFile(tag, fileName)
+        self.requestLoad(tag)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _reportProgress(self, fileName, parsedBytes, fileBytes):
+        """ Worker callback: publish the file loading progress to the frame, only
+            the whole percent changes are published.
+        """
+        pct = parsedBytes*100//fileBytes if fileBytes > 0 else 100
+        if (fileName, pct) == self.lastProgress: return
+        self.lastProgress = (fileName, pct)
+        wx.CallAfter(self.parent.setLoadProgress, fileName, parsedBytes, fileBytes)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _watchJob(self, tag, gen):
+        """ Worker job: stat the folder files, re-ingest the changed files and
+            only update their panel slots if no file is added or removed.
+        """
+        added, removed, changed = self.scanFolder(tag)
+        if not (added or removed or changed): return
+        self.loadCSVData(tag, progress=self._reportProgress, pool=self._getPool())
+        if added or removed: 
+            self._sampleJob(tag, gen) # the panel slots are shifted.
+            return
+        fileList = self.modelFiles if tag == 'M' else self.dataFiles
+        fileIdxs = [idx for idx, dataFile in enumerate(fileList) if dataFile.fileName in changed]
+        filePaths, dataList = self.buildPanelData(tag, fileIdxs=fileIdxs)
+        if not self.isCancelled(tag, gen):
+            wx.CallAfter(self._publishPanelSlots, tag, gen, filePaths, dict(zip(fileIdxs, dataList)))
+
+#--distributionDataMgr---------------------------------------------------------
+    def _publishPanelSlots(self, tag, gen, filePaths, slotData):
+        """ Set the changed files' data {slot idx: data} to the display panel 
+            slots (called in main thread), the other slots are not changed.
+        """
+        if self.isCancelled(tag, gen): return
+        displayPanel = gv.iChartPanel0 if tag == 'M' else gv.iChartPanel1
+        displayPanel.setLabel(filePaths)
+        for idx, data in slotData.items():
+            if idx < displayPanel.dataSetNum: displayPanel.setData(idx, data)
+        displayPanel.updateDisplay()
+
+#--distributionDataMgr---------------------------------------------------------
+    def _sampleJob(self, tag, gen):
+        """ Worker job: build the display data snapshot and publish it."""
+        snapshot = self.buildPanelData(tag)
+        if not self.isCancelled(tag, gen):
+            wx.CallAfter(self._publishPanelData, tag, gen, snapshot)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _publishPanelData(self, tag, gen, snapshot):
+        """ Set the data snapshot to the display panel (called in main thread)."""
+        if self.isCancelled(tag, gen): return
+        filePaths, dataList = snapshot
         displayPanel = gv.iChartPanel0 if tag == 'M' else gv.iChartPanel1
-        dataList = self.modelD if tag == 'M' else self.dataD
+        displayPanel.setLabel(filePaths)
+        if tag == 'M' and gv.iChartPanel3: gv.iChartPanel3.setLabel(filePaths)
         displayPanel.clearData()    # call the clearData to clear the panel record.
-        for idx, dataSet in enumerate(dataList):
-            for num in random.sample(dataSet, len(dataSet)*self.sampleRate//100):
-                if num//1000 >= SAMPLE_COUNT: continue  # filter the too big data.
-                displayPanel.dataD[idx][num//1000] += 1
-            displayPanel.dataD[idx][1] = displayPanel.dataD[idx][0]
-            displayPanel.dataD[idx][0] = 0
-            displayPanel.dataD[idx][-1] = 0 
+        # the files more than the panel's data sets are not shown.
+        for idx, data in enumerate(dataList[:displayPanel.dataSetNum]):
+            displayPanel.setData(idx, data)
         # temperary for compare mode active. 
         if tag == 'M' and gv.iChartPanel0.compareOverlay:
-            displayPanel.dataD[-1] = gv.iChartPanel1.dataD[0]
+            displayPanel.setData(-1, gv.iChartPanel1.dataD[0])
+        displayPanel.updateDisplay()
+
+#--distributionDataMgr---------------------------------------------------------
+    def setPanelData(self, tag):
+        """ Set the data manager's data based on the smaple rate to panel for display. 
+            tag = 'M' : model csv, tag ='D': data csv
+        """
+        self.submitJob(tag, self._sampleJob)
+
+#--distributionDataMgr---------------------------------------------------------
+    def setSampleRate(self, sampleRate):
+        """ Set the sample rate and resample the model and data display panels,
+            the running sample and match jobs are cancelled.
+        """
+        self.cancelJobs('M', 'D', 'C')
+        self.sampleRate = sampleRate
+        self.setPanelData('M')
+        self.setPanelData('D')
+
+#--distributionDataMgr---------------------------------------------------------
+    def setBinView(self, binWidth, binNum=SAMPLE_COUNT, tag=None):
+        """ Set the histogram bin view of the [model]/[data] view (both views if
+            the tag is None) and resample the display panels of the set views 
+            from the histogram pyramid, their running sample jobs and the match
+            job are cancelled.
+        """
+        tags = ('M', 'D') if tag is None else (tag,)
+        self.cancelJobs('C', *tags)
+        dvc.distributionDataCore.setBinView(self, binWidth, binNum=binNum, tag=tag)
+        for key in tags: self.setPanelData(key)
+
+#--distributionDataMgr---------------------------------------------------------
+    def setWindow(self, windowSec):
+        """ Set the time window view and resample the display panels from the
+            window buckets, the running sample and match jobs are cancelled.
+        """
+        self.cancelJobs('M', 'D', 'C')
+        dvc.distributionDataCore.setWindow(self, windowSec)
+        self.setPanelData('M')
+        self.setPanelData('D')
 
 #--distributionDataMgr---------------------------------------------------------
     def setTypeChIdx(self, idx, tag):
-        """ set the [model]/[data] type we are going to load and display."""
+        """ set the [model]/[data] type we are going to load and display, the 
+            running sample and match jobs of the old type are cancelled.
+        """
         if tag == 'M':
             if self.ModeChIdx == idx: return
             self.ModeChIdx = idx
         else:
             if self.DataChIdx == idx: return
             self.DataChIdx = idx
-        self.loadCSVData(tag)
-        self.setPanelData(tag)
+        self.cancelJobs(tag, 'C')
+        self.submitJob(tag, self._selectJob)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _selectJob(self, tag, gen):
+        """ Worker job: switch the data set type and publish the panel data."""
+        self._selectType(tag)
+        self._sampleJob(tag, gen)
 
 #--distributionDataMgr---------------------------------------------------------
     def periodic(self, now):
-        """ Call back every periodic time."""
-        self.setPanelData('M') # load
-        if now - self.lastPeriodicTime >= 4:
-            if 0 <= self.matchFlag <=2: 
-                self.matchData()
-                self.matchFlag += 1
-                gv.iMatchPanel.processDisplay.SetValue(self.matchFlag+1)
-            else:
-                self.matchFlag = -1
-            self.lastPeriodicTime = now
-
-#--distributionDataMgr---------------------------------------------------------
-    def matchData(self):
-        """ match the data from Model list to Data list[0] to find the closest one."""
-        recNum = len(self.dataD[0])*self.sampleRate//100
-        exp1_data, exp2_data = self.dataCut(random.sample(self.modelD[self.matchFlag], recNum), 
-                                            random.sample(self.dataD[0], recNum))
-        min_bt, min_it, max_bt, max_it, tp, tn, fp, fn, thresh_list = self.learnClass(exp1_data, exp2_data)
+        """ Call back every periodic time, submit the jobs to the background 
+            worker if the last same jobs are finished.
+        """
+        # watch the [model]/[data] folders' added, removed and changed files, 
+        # the watch jobs are submitted before the model resample job so they 
+        # are not skipped as busy, the poll time is only moved if submitted.
+        for tag in ('M', 'D'):
+            if gv.iTailFollow and now - self.lastPollTime[tag] >= self.getPollInterval(tag) \
+                    and not self.isBusy(tag):
+                self.submitJob(tag, self._watchJob)
+                self.lastPollTime[tag] = now
+        if not self.isBusy('M'): self.setPanelData('M')
+        if self.listener and not self.isBusy('S'): self.submitJob('S', self._liveJob)
+        if self.matchFlag == 0:
+            self.submitJob('C', self._matchJob)
+            self.matchFlag = -1
+
+#--distributionDataMgr---------------------------------------------------------
+    def _getPool(self):
+        """ Return the process pool used to run the file loading and data match
+            jobs, gv.iWorkerNum worker processes (0 - all the CPU cores).
+        """
+        if self.pool is None:
+            self.pool = dvm.createPool(gv.iWorkerNum)
+        return self.pool
+
+#--distributionDataMgr---------------------------------------------------------
+    def _resetPool(self, pool=None):
+        """ Shut down the broken process pool (the current pool if <pool> is 
+            not given), the next _getPool() creates a new pool.
+        """
+        if pool is None: pool = self.pool
+        if pool is None or pool is not self.pool: return # already rebuilt.
+        self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _matchJob(self, tag, gen):
+        """ Worker job: sample the data and submit the match jobs."""
+        self.matchData(gen)
+
+#--distributionDataMgr---------------------------------------------------------
+    def matchData(self, gen=None):
+        """ match the data from all the Model lists to Data list[0] to find the 
+            closest one. The match job of every model set is submitted to the 
+            process pool at the same time, the samples are passed to the workers
+            in a shared memory block and each result is filled in the match 
+            panel when it arrives.
+        """
+        with self.matchLock:
+            if self.matchShm is not None: return # the last match is not finished.
+        samples = [sample for pair in self.sampleMatchData() for sample in pair]
+        if not samples: return
+        gen = self.jobGen['C'] if gen is None else gen
+        with self.matchLock:
+            self.matchShm, specs = dvm.shareArrays(samples)
+            self.matchPending = len(samples)//2
+        pool, submitNum = None, 0
+        try:
+            pool = self._getPool()
+            for idx in range(len(samples)//2):
+                future = pool.submit(dvm.matchJob, self.matchShm.name, specs[2*idx], specs[2*idx+1])
+                submitNum += 1
+                future.add_done_callback(lambda f, idx=idx: self._onMatchDone(idx, gen, f, pool))
+        except Exception as err:
+            print("DistributionDataMgr: submit the match jobs error: %s" % str(err))
+            if pool and isinstance(err, BrokenProcessPool): self._resetPool(pool)
+            # the jobs not submitted are taken as done, the shared samples are
+            # released here if none of the submitted jobs is still running.
+            self._releaseMatch(len(samples)//2 - submitNum)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _releaseMatch(self, doneNum):
+        """ Count <doneNum> match jobs as done, close and unlink the shared 
+            samples when all the match jobs are done, so the next match can run.
+        """
+        with self.matchLock:
+            self.matchPending -= doneNum
+            if self.matchPending == 0 and self.matchShm is not None:
+                self.matchShm.close()
+                self.matchShm.unlink()
+                self.matchShm = None
+
+#--distributionDataMgr---------------------------------------------------------
+    def _onMatchDone(self, idx, gen, future, pool):
+        """ Match job done call back (called in the pool's thread), release the 
+            shared samples after all the jobs are done and publish the result.
+            The pool is rebuilt for the next jobs if it is broken.
+        """
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._resetPool(pool)
+        self._releaseMatch(1)
+        if not self.isCancelled('C', gen):
+            wx.CallAfter(self._onMatchResult, idx, future)
+
+#--distributionDataMgr---------------------------------------------------------
+    def _onMatchResult(self, idx, future):
+        """ Fill the match result of model set <idx> in the match panel."""
+        try:
+            min_bt, max_bt, tp, tn, fp, fn, sens, spec = result = future.result()
+        except Exception as err:
+            print("Match model data set %s error: %s" %(str(idx), str(err)))
+            return
         print('Minimum Threshold: %s' %str(min_bt))
         print('Maximum Threshold: %s' %str(max_bt))
         print('True Positive: %s' %str(tp))
         print('True Negative: %s' %str(tn))
         print('False Positive: %s' %str(fp))
         print('False Negative: %s' %str(fn))
-        print('Sensitivity: tp/(tp+fn) = %s' %str(tp/(tp+fn)))
-        print('Specifity: tn/(tn+fp) = %s' %str(tn/(tn+fp)))
+        print('Sensitivity: tp/(tp+fn) = %s' %str(sens))
+        print('Specifity: tn/(tn+fp) = %s' %str(spec))
         # Set the display panel:
-        gv.iMatchPanel.fillInData(
-            self.matchFlag, (min_bt, max_bt, tp, tn, fp, fn, tp/(tp+fn), tn/(tn+fp)))
-
-#--distributionDataMgr---------------------------------------------------------
-    def learnClass(self, d1, d2,  resolution=100, verbose=False):
-        """ Get the relate COG different calcualtion result.
-        """
-        min_best_iter = max_best_iter = iteration = b_fp = b_fn = 1
-        moving_thresh = min_best_thresh = max_best_thresh = b_tp = b_tn = 0
-        the_thresh = [(0.0, 0.0, 0.0)]
-        e1 = [(i, -1) for i in d1]
-        e2 = [(i, 1) for i in d2]
-        if np.mean(d1) > np.mean(d2): d1, d2 = d2, d1
-        best_sens = b_tp/(b_tp + b_fn)
-        best_spec = b_tn/(b_tn + b_fp)
-        lb = np.mean(d1)
-        ub = np.mean(d2)
-        steps = (ub - lb)/resolution
-        moving_thresh = min_best_thresh = max_best_thresh = lb
-        the_thresh.append((moving_thresh, min_best_thresh, max_best_thresh))
-        while(moving_thresh <= ub):
-            moving_thresh += steps
-            p1 = []
-            p2 = []
-            c_tp = c_tn = c_fp = c_fn = 0
-            for e in e1:
-                _ = p1.append(e) if e[0] < moving_thresh else p2.append(e)
-            # print 'Classifying second distribution.'
-            for e in e2:
-                _ = p1.append(e) if e[0] < moving_thresh else p2.append(e)
-            # print 'Evaluating negative class members.'
-            for p in p1:
-                if p[1] == -1:
-                    c_tn += 1
-                else:
-                    c_fn += 1
-            # print 'Evaluating positive class members.'
-            for p in p2:
-                if p[1] == 1:
-                    c_tp += 1
-                else:
-                    c_fp += 1
-            # print 'Comparing threashold fitness.'
-            cur_sens = c_tp/(c_tp + c_fn)
-            cur_spec = c_tn/(c_tn + c_fp)
-
-            ### HERE is the fitness metric
-            if (cur_sens > best_sens and cur_spec >= best_spec) or (cur_sens >= best_sens and cur_spec > best_spec):
-                min_best_thresh = moving_thresh
-                max_best_thresh = moving_thresh
-                the_thresh.append((moving_thresh, moving_thresh, moving_thresh))
-                min_best_iter = iteration
-                max_best_iter = iteration
-                b_tp, b_tn, b_fp, b_fn = c_tp, c_tn, c_fp, c_fn
-                best_sens = b_tp/(b_tp + b_fn)
-                best_spec = b_tn/(b_tn + b_fp)
-
-            elif cur_sens == best_sens and cur_spec == best_spec:
-                max_best_thresh = moving_thresh
-                max_best_iter = iteration
-                the_thresh.append((moving_thresh, min_best_thresh, moving_thresh))
-            else:
-                the_thresh.append(
-                    (moving_thresh, min_best_thresh, max_best_thresh))
-            iteration += 1
-        return min_best_thresh, min_best_iter, max_best_thresh, max_best_iter, b_tp, b_tn, b_fp, b_fn, the_thresh
-
-#-----------------------------------------------------------------------------
-    def dataCut(self, d1, d2):
-        """ Cuart the data set to positive and negative. """
-        c1, c2 = [], []
-        e1, e2 = np.array(d1), np.array(d2)
-        if e1.mean() > e2.mean():
-            e1, e2 = e2, e1
-        e1_mean = e1.mean()
-        e2_mean = e2.mean()
-        win = min(e1.std(), e2.std())
-        for e in e1:
-            if e > e1_mean - win and e < e2_mean + win:
-                c1.append(e)
-        for e in e2:
-            if e > e1_mean - win and e < e2_mean + win:
-                c2.append(e)
-        return c1, c2
+        gv.iMatchPanel.fillInData(idx, result)
+        gv.iMatchPanel.processDisplay.SetValue(gv.iMatchPanel.processDisplay.GetValue()+1)
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -668,5 +994,7 @@ class MyApp(wx.App):
         mainFrame.Show(True)
         return True
 
-app = MyApp(0)
-app.MainLoop()
+# the main guard is needed as the process pool workers import the main module.
+if __name__ == '__main__':
+    app = MyApp(0)
+    app.MainLoop()
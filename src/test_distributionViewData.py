@@ -0,0 +1,219 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        test_distributionViewData.py
+#
+# Purpose:     This module is used to check the behaviour of the CSV data
+#              module distributionViewData on small temporary CSV files: the
+#              bulk parser, the tail follow update (partial last line,
+#              truncate/rewrite and in place modification), the sidecar cache
+#              invalidation, the out-of-core reservoir mode and the time
+#              window buckets.
+#
+#              Usage example:
+#              python -m pytest test_distributionViewData.py
+#              python test_distributionViewData.py
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import os
+import tempfile
+import numpy as np
+
+import distributionViewData as dvd
+
+HEADER = b'exp:1559985507532879000,127.0.0.1,1073741824,1024\n'
+
+#-----------------------------------------------------------------------------
+def genRows(rowNum, seed=0, startT=1559985507532879, step=320):
+    """ Return the (rowNum, ROW_LEN) random NetFetcher rows."""
+    rng = np.random.default_rng(seed)
+    rows = np.empty((rowNum, dvd.ROW_LEN), dtype=np.int64)
+    rows[:, 0] = startT + np.arange(rowNum)*step
+    rows[:, 1:] = rng.lognormal(np.log(3000), 1.0, (rowNum, dvd.ROW_LEN-1)).astype(np.int64)
+    return rows
+
+#-----------------------------------------------------------------------------
+def rowLines(rows):
+    """ Return the CSV lines (bytes) of the rows."""
+    return [(','.join(str(val) for val in row) + '\n').encode() for row in rows.tolist()]
+
+#-----------------------------------------------------------------------------
+def writeFile(fileName, data, mtimeNs=None):
+    """ Write the file and set its mtime (so the in place change is seen)."""
+    with open(fileName, 'wb') as f:
+        f.write(data)
+    if mtimeNs is not None: os.utime(fileName, ns=(mtimeNs, mtimeNs))
+
+#-----------------------------------------------------------------------------
+def checkColumns(dataFile, rows):
+    """ Check the file's columns are the rows' delay type columns."""
+    assert dataFile.rowNum == len(rows)
+    assert (np.asarray(dataFile.columns) == dvd.rowsToColumns(rows)).all()
+
+#-----------------------------------------------------------------------------
+def test_parse_rows():
+    """ The bulk parser result and the malformed lines fall back."""
+    rows = genRows(100)
+    assert (dvd.parseRows(rowLines(rows)) == rows).all()
+    # a short and a long line must not be merged into 2 rows.
+    assert dvd.parseRows([b'1,2,3,4,5\n', b'1,2,3,4,5,6,7\n']).tolist() == [[1, 2, 3, 4, 5, 6]]
+    assert dvd.parseRows([b'1,2,3,4,5,6\r\n', b'x,1\n', b'7,8,9,10,11,12']).tolist() == \
+        [[1, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12]]
+    assert dvd.parseRows([b'18446744073709551615,1,2,3,4,5\n'])[0, 0] == dvd.ROW_MAX
+    assert dvd.parseRows([]).shape == (0, dvd.ROW_LEN)
+
+#-----------------------------------------------------------------------------
+def test_header_detect():
+    """ The header line is skipped by its content, not by its position."""
+    rows = genRows(3)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for header in (HEADER, b''):
+            fileName = os.path.join(tmpDir, 'exp.csv')
+            writeFile(fileName, header + b''.join(rowLines(rows)))
+            dataFile = dvd.csvDataFile(fileName, useCache=False)
+            dataFile.load()
+            checkColumns(dataFile, rows)
+            streamFile = dvd.csvDataFile(fileName, useCache=False)
+            assert streamFile.appendLines(([header] if header else []) + rowLines(rows)) == 3
+            assert streamFile.offset == os.path.getsize(fileName)
+
+#-----------------------------------------------------------------------------
+def test_tail_partial_line():
+    """ The last line without the line end is parsed after it is completed."""
+    rows = genRows(50)
+    lines = rowLines(rows)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fileName = os.path.join(tmpDir, 'exp.csv')
+        half = len(lines[30])//2
+        writeFile(fileName, HEADER + b''.join(lines[:30]) + lines[30][:half])
+        dataFile = dvd.csvDataFile(fileName, useCache=False)
+        dataFile.load()
+        checkColumns(dataFile, rows[:30])
+        assert dataFile.offset == len(HEADER) + sum(len(line) for line in lines[:30])
+        with open(fileName, 'ab') as f:
+            f.write(lines[30][half:] + b''.join(lines[31:]))
+        assert dataFile.update() == 20
+        checkColumns(dataFile, rows)
+        assert dataFile.update() == 0
+
+#-----------------------------------------------------------------------------
+def test_tail_truncate_rewrite():
+    """ The truncated or replaced file is fully reloaded."""
+    rows = genRows(40)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fileName = os.path.join(tmpDir, 'exp.csv')
+        writeFile(fileName, HEADER + b''.join(rowLines(rows)))
+        dataFile = dvd.csvDataFile(fileName, useCache=False)
+        dataFile.load()
+        writeFile(fileName, HEADER + b''.join(rowLines(rows[:10])))
+        assert dataFile.update() == -1
+        checkColumns(dataFile, rows[:10])
+        newRows = genRows(15, seed=1)
+        writeFile(fileName + '.new', HEADER + b''.join(rowLines(newRows)))
+        os.replace(fileName + '.new', fileName)     # new inode, may be the same size.
+        assert dataFile.update() == -1
+        checkColumns(dataFile, newRows)
+
+#-----------------------------------------------------------------------------
+def test_tail_modify_in_place():
+    """ The file changed in place (same size, new mtime) is fully reloaded."""
+    rows = genRows(20)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fileName = os.path.join(tmpDir, 'exp.csv')
+        data = HEADER + b''.join(rowLines(rows))
+        writeFile(fileName, data, mtimeNs=10**18)
+        dataFile = dvd.csvDataFile(fileName, useCache=False)
+        dataFile.load()
+        newRows = rows.copy()
+        newRows[5, 1] = int(str(rows[5, 1])[::-1]) # same digits number.
+        newData = HEADER + b''.join(rowLines(newRows))
+        assert len(newData) == len(data)
+        writeFile(fileName, newData, mtimeNs=10**18 + 10**9)
+        assert dataFile.update() == -1
+        checkColumns(dataFile, newRows)
+
+#-----------------------------------------------------------------------------
+def test_cache_invalidation():
+    """ The sidecar cache is used while the file is not changed and rebuilt
+        after the file is changed.
+    """
+    rows = genRows(30)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fileName = os.path.join(tmpDir, 'exp.csv')
+        writeFile(fileName, HEADER + b''.join(rowLines(rows)), mtimeNs=10**18)
+        dvd.csvDataFile(fileName).load()
+        dataFile = dvd.csvDataFile(fileName)
+        dataFile.load()
+        assert isinstance(dataFile._buffer, np.memmap)  # loaded from the cache.
+        checkColumns(dataFile, rows)
+        newRows = genRows(12, seed=2)
+        writeFile(fileName, HEADER + b''.join(rowLines(newRows)), mtimeNs=10**18 + 10**9)
+        dataFile.load()     # the mapped old cache version is replaced.
+        checkColumns(dataFile, newRows)
+        cached = dvd.csvDataFile(fileName)
+        cached.load()
+        assert isinstance(cached._buffer, np.memmap)
+        checkColumns(cached, newRows)
+        cacheFiles = [name for name in os.listdir(tmpDir) if name.endswith(dvd.CACHE_EXT)]
+        assert len(cacheFiles) == 1
+
+#-----------------------------------------------------------------------------
+def test_reservoir():
+    """ The out-of-core mode keeps a bounded reservoir, but its histograms and
+        row counts are exact (the not pyramid bin width is scaled).
+    """
+    rows = genRows(5000)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fileName = os.path.join(tmpDir, 'exp.csv')
+        writeFile(fileName, HEADER + b''.join(rowLines(rows)))
+        fullFile = dvd.csvDataFile(fileName, useCache=False)
+        fullFile.load()
+        dataFile = dvd.csvDataFile(fileName, useCache=False, outOfCore=True, reservoirNum=500)
+        dataFile.load(lambda done, total: None)
+        assert dataFile.rowNum == 5000 and dataFile.columns.shape == (dvd.TYPE_NUM, 500)
+        # the reservoir rows are the file rows.
+        fileRows = set(map(tuple, dvd.rowsToColumns(rows).T.tolist()))
+        assert set(map(tuple, dataFile.columns.T.tolist())) <= fileRows
+        for binWidth in dvd.PYRAMID_WIDTHS:
+            assert (dataFile.getHistograms(binWidth, 700) == fullFile.getHistograms(binWidth, 700)).all()
+        hists = dataFile.getHistograms(15, 700)
+        assert (abs(hists.sum(axis=1) - 5000) <= 1).all()
+
+#-----------------------------------------------------------------------------
+def test_window():
+    """ The window histograms are the same as binning the rows in the window,
+        the old buckets are dropped.
+    """
+    rows = genRows(3000, step=40000)    # 120 s of rows.
+    columns, times = dvd.rowsToColumns(rows), rows[:, 0]
+    window = dvd.windowHistograms(60)
+    for start in range(0, len(rows), 700):
+        window.add(times[start:start+700], columns[:, start:start+700])
+    assert len(window.buckets) <= 60
+    lastId = times[-1]//dvd.BUCKET_TIME
+    for windowSec in (1, 10, 60):
+        used = times//dvd.BUCKET_TIME > lastId - windowSec
+        expected = dvd.buildHistograms(columns[:, used], 2000, 300)
+        assert (window.getHistograms(windowSec*dvd.BUCKET_TIME, 2000, 300) == expected).all()
+        assert (window.getHistograms(windowSec*dvd.BUCKET_TIME, 2000, 300, typeIdx=3) == expected[3]).all()
+    assert window.getHistograms(10*dvd.BUCKET_TIME, 10, 300) is None
+    # a snapshot is not changed by the later rows.
+    snapshot = window.snapshot()
+    before = snapshot.getHistograms(60*dvd.BUCKET_TIME)
+    window.add(times[-10:], columns[:, -10:])
+    assert (snapshot.getHistograms(60*dvd.BUCKET_TIME) == before).all()
+    assert window.getHistograms(60*dvd.BUCKET_TIME).sum() == before.sum() + 10*dvd.TYPE_NUM
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    for testFunc in (test_parse_rows, test_header_detect, test_tail_partial_line,
+                     test_tail_truncate_rewrite, test_tail_modify_in_place,
+                     test_cache_invalidation, test_reservoir, test_window):
+        testFunc()
+        print("%s: passed" % testFunc.__name__)
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        test_distributionViewMatch.py
+#
+# Purpose:     This module is used to check the sorted sweep learnClass() of
+#              the distributionViewMatch module against the original loop
+#              implementation: all the 9 return values must be the same.
+#
+#              Usage example:
+#              python -m pytest test_distributionViewMatch.py
+#              python test_distributionViewMatch.py
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2019/08/02
+# Version:     v_0.1.2
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+import distributionViewMatch as dvm
+
+#-----------------------------------------------------------------------------
+def loopLearnClass(d1, d2,  resolution=100):
+    """ The original learnClass() loop implementation (every threshold splits
+        all the samples), only the equal means break is added as the original
+        loop never ends if the 2 data sets have the same mean.
+    """
+    min_best_iter = max_best_iter = iteration = b_fp = b_fn = 1
+    moving_thresh = min_best_thresh = max_best_thresh = b_tp = b_tn = 0
+    the_thresh = [(0.0, 0.0, 0.0)]
+    e1 = [(i, -1) for i in d1]
+    e2 = [(i, 1) for i in d2]
+    if np.mean(d1) > np.mean(d2): d1, d2 = d2, d1
+    best_sens = b_tp/(b_tp + b_fn)
+    best_spec = b_tn/(b_tn + b_fp)
+    lb = np.mean(d1)
+    ub = np.mean(d2)
+    steps = (ub - lb)/resolution
+    moving_thresh = min_best_thresh = max_best_thresh = lb
+    the_thresh.append((moving_thresh, min_best_thresh, max_best_thresh))
+    while(moving_thresh <= ub):
+        moving_thresh += steps
+        p1 = []
+        p2 = []
+        c_tp = c_tn = c_fp = c_fn = 0
+        for e in e1:
+            _ = p1.append(e) if e[0] < moving_thresh else p2.append(e)
+        for e in e2:
+            _ = p1.append(e) if e[0] < moving_thresh else p2.append(e)
+        for p in p1:
+            if p[1] == -1:
+                c_tn += 1
+            else:
+                c_fn += 1
+        for p in p2:
+            if p[1] == 1:
+                c_tp += 1
+            else:
+                c_fp += 1
+        cur_sens = c_tp/(c_tp + c_fn)
+        cur_spec = c_tn/(c_tn + c_fp)
+        if (cur_sens > best_sens and cur_spec >= best_spec) or (cur_sens >= best_sens and cur_spec > best_spec):
+            min_best_thresh = moving_thresh
+            max_best_thresh = moving_thresh
+            the_thresh.append((moving_thresh, moving_thresh, moving_thresh))
+            min_best_iter = iteration
+            max_best_iter = iteration
+            b_tp, b_tn, b_fp, b_fn = c_tp, c_tn, c_fp, c_fn
+            best_sens = b_tp/(b_tp + b_fn)
+            best_spec = b_tn/(b_tn + b_fp)
+        elif cur_sens == best_sens and cur_spec == best_spec:
+            max_best_thresh = moving_thresh
+            max_best_iter = iteration
+            the_thresh.append((moving_thresh, min_best_thresh, moving_thresh))
+        else:
+            the_thresh.append(
+                (moving_thresh, min_best_thresh, max_best_thresh))
+        iteration += 1
+        if steps <= 0: break
+    return min_best_thresh, min_best_iter, max_best_thresh, max_best_iter, b_tp, b_tn, b_fp, b_fn, the_thresh
+
+#-----------------------------------------------------------------------------
+def checkSame(d1, d2, resolution=100):
+    """ Check all the learnClass() return values are the same as the loop's."""
+    expected = loopLearnClass(list(d1), list(d2), resolution=resolution)
+    result = dvm.learnClass(d1, d2, resolution=resolution)
+    assert len(result) == len(expected) == 9
+    for idx, (val, expVal) in enumerate(zip(result, expected)):
+        assert val == expVal, "return value %d: %s != %s" % (idx, str(val), str(expVal))
+
+#-----------------------------------------------------------------------------
+def test_random():
+    """ Random integer delays (the CSV data type), both means orders."""
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        num1, num2 = rng.integers(1, 300, 2)
+        d1 = rng.integers(0, 5000, num1)
+        d2 = rng.integers(0, 5000, num2) + rng.integers(0, 3000)
+        resolution = int(rng.choice((10, 37, 100)))
+        checkSame(d1, d2, resolution)
+        checkSame(d2, d1, resolution)
+
+#-----------------------------------------------------------------------------
+def test_ties():
+    """ Few distinct values: the thresholds hit the tied samples and the
+        equal fitness thresholds move the max best threshold.
+    """
+    rng = np.random.default_rng(1)
+    for _ in range(40):
+        d1 = rng.integers(0, 5, rng.integers(1, 100))
+        d2 = rng.integers(2, 8, rng.integers(1, 100))
+        checkSame(d1, d2, int(rng.choice((3, 10, 100))))
+    checkSame(np.array([1, 1, 2, 2, 3]), np.array([2, 2, 3, 3, 4]), 4)
+
+#-----------------------------------------------------------------------------
+def test_equal_means():
+    """ The same means: only one threshold is evaluated."""
+    checkSame(np.array([1, 2, 3]), np.array([2, 2, 2]))
+    checkSame(np.array([5, 5]), np.array([5]))
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__':
+    for testFunc in (test_random, test_ties, test_equal_means):
+        testFunc()
+        print("%s: passed" % testFunc.__name__)